@@ -0,0 +1,74 @@
+"""
+Compares the latency and peak memory of `image_to_base64` with and without draft mode.
+
+Usage:
+    python benchmarks/images.py --width 6000 --height 4000 --size 256
+"""
+
+import argparse
+from multiprocessing import get_context
+import os
+import resource
+import statistics
+import sys
+from tempfile import TemporaryDirectory
+import time
+
+from django.conf import settings
+from PIL import Image
+
+from django_utils_kit.images import DEFAULT_REDUCING_GAP, image_to_base64
+
+
+def make_jpeg(file_path: str, width: int, height: int) -> None:
+    """Creates a noisy JPEG image so that it is not trivially compressed."""
+    noise = Image.effect_noise((width, height), 64)
+    img = Image.merge(
+        "RGB", (noise, noise.transpose(Image.Transpose.ROTATE_180), noise)
+    )
+    img.save(file_path, format="JPEG", quality=90)
+
+
+def run(
+    file_path: str, size: int, reducing_gap: float | None, repeat: int
+) -> tuple[float, float]:
+    """Downsizes the image `repeat` times and returns the median latency and peak RSS."""
+    if not settings.configured:
+        settings.configure()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        image_to_base64(file_path, size, reducing_gap=reducing_gap)
+        durations.append(time.perf_counter() - start)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux returns kilobytes, macOS returns bytes
+    peak_rss_mb = peak_rss / 1024 if sys.platform != "darwin" else peak_rss / 1024**2
+    return statistics.median(durations) * 1000, peak_rss_mb
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--width", type=int, default=6000)
+    parser.add_argument("--height", type=int, default=4000)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    cases = {"full decode": None, "draft mode": DEFAULT_REDUCING_GAP}
+    # Every step runs in its own process to isolate its peak RSS
+    context = get_context("spawn")
+    with TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "image.jpg")
+        with context.Pool(1) as pool:
+            pool.apply(make_jpeg, (file_path, args.width, args.height))
+        file_size = os.path.getsize(file_path) / 1024**2
+        print(f"{args.width}x{args.height} JPEG ({file_size:.1f} MB) -> {args.size}px")
+        for label, reducing_gap in cases.items():
+            with context.Pool(1) as pool:
+                latency, peak_rss = pool.apply(
+                    run, (file_path, args.size, reducing_gap, args.repeat)
+                )
+            print(f"{label:<12} {latency:>8.1f} ms {peak_rss:>8.1f} MB peak RSS")
+
+
+if __name__ == "__main__":
+    main()
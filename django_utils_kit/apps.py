@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.utils.module_loading import autodiscover_modules
+
+
+class DjangoUtilsKitConfig(AppConfig):
+    name = "django_utils_kit"
+    verbose_name = "Django Utils Kit"
+
+    def ready(self) -> None:
+        if getattr(settings, "EMAIL_PREWARM_TEMPLATES", False):
+            from django_utils_kit.emails import prewarm_email_templates
+
+            # Imports the `emails` module of each app, where `Email` instances live
+            autodiscover_modules("emails")
+            prewarm_email_templates()
@@ -1,20 +1,370 @@
 """Classes to easily send sync and async emails through Django."""
 
-from threading import Thread
-from typing import Any
+import asyncio
+import atexit
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+import time
+from typing import TYPE_CHECKING, Any, ClassVar, NamedTuple
+from weakref import WeakSet
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.core.mail import EmailMessage
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.message import sanitize_address
 from django.template import loader
+from django.utils.module_loading import import_string
+
+if TYPE_CHECKING:
+    from django_utils_kit.outbox.models import OutboxEmail
+
+EMAIL_MAX_WORKERS = 4
+EMAIL_MAX_QUEUE_SIZE = 1000
+EMAIL_QUEUE_BLOCK = "block"
+EMAIL_QUEUE_DROP = "drop"
+EMAIL_RECONNECT_EVERY = 100
+EMAIL_ASYNC_CONCURRENCY = 10
+DJANGO_SMTP_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+
+_email_pool: "EmailWorkerPool | None" = None
+_email_pool_lock = Lock()
+
+
+class EmailQueueFullError(RuntimeError):
+    """Raised when an email cannot be queued because the worker pool is full."""
+
+
+class EmailFailure(NamedTuple):
+    """Email that could not be rendered or sent by `Email.send_many`."""
+
+    index: int
+    to: list[str]
+    error: Exception
+
+
+class EmailBatchResult(NamedTuple):
+    """Outcome of `Email.send_many`."""
+
+    sent: int
+    failures: list[EmailFailure]
+    duration: float
+
+    @property
+    def throughput(self) -> float:
+        """Number of emails sent per second."""
+        return self.sent / self.duration if self.duration else 0.0
+
+
+class EmailWorkerPool:
+    """
+    Bounded pool of threads sending emails from a bounded queue.
+    When the queue is full, `submit` either blocks until a slot is free (or the timeout expires)
+    or drops the email, depending on the policy. Dropped emails return a failed `Future`.
+    Pending emails are sent before the process exits.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = EMAIL_MAX_WORKERS,
+        max_queue_size: int = EMAIL_MAX_QUEUE_SIZE,
+        policy: str = EMAIL_QUEUE_BLOCK,
+        timeout: float | None = None,
+    ) -> None:
+        """
+        Args:
+            max_workers (int, optional): number of threads (and SMTP connections).
+                Defaults to EMAIL_MAX_WORKERS.
+            max_queue_size (int, optional): max number of emails waiting for a thread.
+                Defaults to EMAIL_MAX_QUEUE_SIZE.
+            policy (str, optional): EMAIL_QUEUE_BLOCK or EMAIL_QUEUE_DROP when the queue is full.
+                Defaults to EMAIL_QUEUE_BLOCK.
+            timeout (float | None, optional): max seconds to block before raising
+                `EmailQueueFullError`. Defaults to None (no limit).
+        """
+        if policy not in (EMAIL_QUEUE_BLOCK, EMAIL_QUEUE_DROP):
+            raise ValueError(f"Unknown email queue policy: {policy}")
+        self.policy = policy
+        self.timeout = timeout
+        self._slots = BoundedSemaphore(max_workers + max_queue_size)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="django_utils_kit.email"
+        )
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """
+        Queues a call to `fn` once a slot is free in the queue.
+
+        Args:
+            fn (Callable[..., Any]): the function to call in a worker thread
+            *args (Any): its positional arguments
+            **kwargs (Any): its keyword arguments
+
+        Raises:
+            EmailQueueFullError: if the queue is still full after `timeout` with the block policy
+
+        Returns:
+            Future: the future result of the call
+        """
+        if self.policy == EMAIL_QUEUE_DROP:
+            acquired = self._slots.acquire(blocking=False)
+        else:
+            acquired = self._slots.acquire(timeout=self.timeout)
+        if not acquired:
+            if self.policy == EMAIL_QUEUE_BLOCK:
+                raise EmailQueueFullError("The email queue is full")
+            future: Future = Future()
+            future.set_exception(EmailQueueFullError("The email queue is full"))
+            return future
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False) -> None:
+        """
+        Stops accepting emails and, by default, waits for the queued ones to be sent.
+
+        Args:
+            wait (bool, optional): waits for the queued emails. Defaults to True.
+            cancel_pending (bool, optional): cancels the emails not yet being sent.
+                Defaults to False.
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_pending)
+
+
+def get_email_pool() -> EmailWorkerPool:
+    """
+    Returns the shared `EmailWorkerPool` used by `Email.send_async`, creating it on first use.
+    It is configured by `settings.EMAIL_MAX_WORKERS`, `settings.EMAIL_MAX_QUEUE_SIZE`,
+    `settings.EMAIL_QUEUE_POLICY` and `settings.EMAIL_QUEUE_TIMEOUT`,
+    and drained when the process exits.
+
+    Returns:
+        EmailWorkerPool: the shared pool
+    """
+    global _email_pool
+    with _email_pool_lock:
+        if _email_pool is None:
+            _email_pool = EmailWorkerPool(
+                max_workers=getattr(settings, "EMAIL_MAX_WORKERS", EMAIL_MAX_WORKERS),
+                max_queue_size=getattr(
+                    settings, "EMAIL_MAX_QUEUE_SIZE", EMAIL_MAX_QUEUE_SIZE
+                ),
+                policy=getattr(settings, "EMAIL_QUEUE_POLICY", EMAIL_QUEUE_BLOCK),
+                timeout=getattr(settings, "EMAIL_QUEUE_TIMEOUT", None),
+            )
+            atexit.register(_email_pool.shutdown)
+        return _email_pool
+
+
+class BaseAsyncEmailBackend:
+    """
+    Base class for the async transports of `Email.asend` and `Email.asend_many`.
+    Can be used as an async context manager to open and close the connection.
+    """
+
+    async def open(self) -> None:
+        """Opens the connection, if any."""
+
+    async def close(self) -> None:
+        """Closes the connection, if any."""
+
+    async def send_messages(self, messages: list[EmailMessage]) -> int:
+        """
+        Sends the messages and returns the number of sent messages.
+        Opens the connection if needed, and then closes it, but leaves it open otherwise.
+
+        Args:
+            messages (list[EmailMessage]): the messages to send
+
+        Returns:
+            int: the number of sent messages
+        """
+        raise NotImplementedError
+
+    async def __aenter__(self) -> "BaseAsyncEmailBackend":  # noqa: PYI034
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        await self.close()
+
+
+class SyncAsyncEmailBackend(BaseAsyncEmailBackend):
+    """
+    Async transport running a regular Django email backend in a thread,
+    for backends without async support (console, file, locmem...).
+    """
+
+    def __init__(self, backend: str | None = None, **kwargs: Any) -> None:
+        """
+        Args:
+            backend (str | None, optional): dotted path of the Django backend.
+                Defaults to None (`settings.EMAIL_BACKEND`).
+            **kwargs (Any): options of the Django backend
+        """
+        self.connection = get_connection(backend, **kwargs)
+
+    async def open(self) -> None:
+        await sync_to_async(self.connection.open, thread_sensitive=False)()
+
+    async def close(self) -> None:
+        await sync_to_async(self.connection.close, thread_sensitive=False)()
+
+    async def send_messages(self, messages: list[EmailMessage]) -> int:
+        send_messages = sync_to_async(
+            self.connection.send_messages, thread_sensitive=False
+        )
+        return await send_messages(messages) or 0
+
+
+class SMTPAsyncEmailBackend(BaseAsyncEmailBackend):
+    """
+    Async SMTP transport built on `aiosmtplib`, from the `async-smtp` extra.
+    Uses the same `EMAIL_*` settings as the Django SMTP backend.
+    """
+
+    def __init__(
+        self,
+        host: str | None = None,
+        port: int | None = None,
+        username: str | None = None,
+        password: str | None = None,
+        use_tls: bool | None = None,
+        use_ssl: bool | None = None,
+        timeout: float | None = None,
+    ) -> None:
+        """
+        Args:
+            host (str | None, optional): Defaults to `settings.EMAIL_HOST`.
+            port (int | None, optional): Defaults to `settings.EMAIL_PORT`.
+            username (str | None, optional): Defaults to `settings.EMAIL_HOST_USER`.
+            password (str | None, optional): Defaults to `settings.EMAIL_HOST_PASSWORD`.
+            use_tls (bool | None, optional): STARTTLS. Defaults to `settings.EMAIL_USE_TLS`.
+            use_ssl (bool | None, optional): implicit TLS. Defaults to `settings.EMAIL_USE_SSL`.
+            timeout (float | None, optional): Defaults to `settings.EMAIL_TIMEOUT`.
+        """
+        self.host = host or settings.EMAIL_HOST
+        self.port = port or settings.EMAIL_PORT
+        self.username = settings.EMAIL_HOST_USER if username is None else username
+        self.password = settings.EMAIL_HOST_PASSWORD if password is None else password
+        self.use_tls = settings.EMAIL_USE_TLS if use_tls is None else use_tls
+        self.use_ssl = settings.EMAIL_USE_SSL if use_ssl is None else use_ssl
+        self.timeout = settings.EMAIL_TIMEOUT if timeout is None else timeout
+        self.client: Any = None
+
+    async def open(self) -> None:
+        if self.client is not None:
+            return
+        try:
+            import aiosmtplib
+        except ImportError as e:
+            raise ImproperlyConfigured(
+                "SMTPAsyncEmailBackend requires the aiosmtplib package, "
+                'install "django-utils-kit[async-smtp]"'
+            ) from e
+        client = aiosmtplib.SMTP(
+            hostname=self.host,
+            port=self.port,
+            username=self.username or None,
+            password=self.password or None,
+            use_tls=self.use_ssl,
+            start_tls=self.use_tls,
+            timeout=self.timeout,
+        )
+        await client.connect()
+        self.client = client
+
+    async def close(self) -> None:
+        if self.client is None:
+            return
+        client, self.client = self.client, None
+        try:
+            await client.quit()
+        except Exception:  # noqa: BLE001
+            client.close()
+
+    async def send_messages(self, messages: list[EmailMessage]) -> int:
+        opened = self.client is None
+        await self.open()
+        sent = 0
+        try:
+            for message in messages:
+                recipients = message.recipients()
+                if not recipients:
+                    continue
+                encoding = message.encoding or settings.DEFAULT_CHARSET
+                await self.client.sendmail(
+                    sanitize_address(message.from_email, encoding),
+                    [sanitize_address(address, encoding) for address in recipients],
+                    message.message().as_bytes(linesep="\r\n"),
+                )
+                sent += 1
+        finally:
+            if opened:
+                await self.close()
+        return sent
+
+
+def get_async_connection(
+    backend: str | None = None, **kwargs: Any
+) -> BaseAsyncEmailBackend:
+    """
+    Returns an async email transport for `Email.asend` and `Email.asend_many`.
+    Defaults to `settings.EMAIL_ASYNC_BACKEND`, or to `SMTPAsyncEmailBackend` if the
+    Django SMTP backend is used, or else to `SyncAsyncEmailBackend` wrapping `settings.EMAIL_BACKEND`.
+
+    Args:
+        backend (str | None, optional): dotted path of a `BaseAsyncEmailBackend` class.
+            Defaults to None.
+        **kwargs (Any): options of the transport
+
+    Returns:
+        BaseAsyncEmailBackend: the async transport
+    """
+    backend = backend or getattr(settings, "EMAIL_ASYNC_BACKEND", None)
+    if backend is None:
+        if settings.EMAIL_BACKEND == DJANGO_SMTP_BACKEND:
+            return SMTPAsyncEmailBackend(**kwargs)
+        return SyncAsyncEmailBackend(**kwargs)
+    return import_string(backend)(**kwargs)
+
+
+def prewarm_email_templates() -> int:
+    """
+    Compiles the templates of all existing `Email` instances, so that the first emails
+    don't have to. Called on startup if `settings.EMAIL_PREWARM_TEMPLATES` is True,
+    after importing the `emails` module of each installed app,
+    for the emails defined there or in modules already imported by then.
+
+    Returns:
+        int: the number of compiled templates
+    """
+    emails = list(Email.instances)
+    for email in emails:
+        email.get_template()
+    return len(emails)
 
 
 class Email:
-    """Class to send async/sync emails through Django using templates and contexts."""
+    """
+    Class to send async/sync emails through Django using templates and contexts.
+    The template is compiled once per instance, on first use or by `prewarm_email_templates`.
+    """
+
+    instances: ClassVar["WeakSet[Email]"] = WeakSet()
 
     def __init__(
         self,
         default_subject: str,
         template_path: str,
+        autoreload: bool = False,
     ) -> None:
         """
         Initializes the Email class with a template and a default subject.
@@ -22,9 +372,27 @@ class Email:
         Args:
             default_subject (str): The default subject of the email (can be overridden in `send`).
             template_path (str): The path to the template to use for the email.
+            autoreload (bool, optional): Reloads the template on every email when `settings.DEBUG`
+                is True. Defaults to False.
         """
         self.default_subject = default_subject
         self.template_path = template_path
+        self.autoreload = autoreload
+        self._template: Any = None
+        self.instances.add(self)
+
+    def get_template(self) -> Any:
+        """
+        Returns the compiled template of the email, loading it on first use.
+
+        Returns:
+            Any: the template of the configured engine
+        """
+        if self.autoreload and settings.DEBUG:
+            return loader.get_template(self.template_path)
+        if self._template is None:
+            self._template = loader.get_template(self.template_path)
+        return self._template
 
     def send(
         self,
@@ -47,23 +415,76 @@ class Email:
             bcc (list[str] | None, optional): The list of BCC recipients. Defaults to None.
             from_email (Optional[str], optional): The sender email address. Defaults to None.
         """
-        to = to or []
-        cc = cc or []
-        bcc = bcc or []
         # Skip if no recipients
         if not to and not cc and not bcc:
             return
-        email = EmailMessage(
-            subject=subject or self.default_subject,
-            body=self._render_template(self.template_path, context),
-            to=to,
-            cc=cc,
-            bcc=bcc,
-            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
-        )
-        email.content_subtype = "html"
+        email = self._build_message(context, subject, to, cc, bcc, from_email)
         email.send()
 
+    def send_many(
+        self,
+        items: Iterable[tuple[dict[str, Any], list[str]]],
+        subject: str | None = None,
+        from_email: str | None = None,
+        connection: BaseEmailBackend | None = None,
+        reconnect_every: int | None = EMAIL_RECONNECT_EVERY,
+    ) -> EmailBatchResult:
+        """
+        Sends one email per (context, recipients) item through a single connection.
+        Items without recipients are skipped. Failures are collected without stopping the batch,
+        and the connection is reopened after a sending failure.
+
+        Args:
+            items (Iterable[tuple[dict[str, Any], list[str]]]): The contexts and their recipients.
+            subject (str | None, optional): The subject of the emails. Defaults to None.
+            from_email (str | None, optional): The sender email address. Defaults to None.
+            connection (BaseEmailBackend | None, optional): The connection to use.
+                Defaults to None (`get_connection()`).
+            reconnect_every (int | None, optional): Reopens the connection every N emails.
+                Defaults to EMAIL_RECONNECT_EVERY.
+
+        Returns:
+            EmailBatchResult: The number of sent emails, the failures, and the duration.
+
+        Usage:
+            >>> items = [({"name": user.name}, [user.email]) for user in users]
+            >>> result = Email("Hello", "hello.html").send_many(items)
+            >>> print(f"{result.sent} sent ({result.throughput:.1f}/s)")
+        """
+        connection = connection or get_connection()
+        start = time.perf_counter()
+        sent = 0
+        failures: list[EmailFailure] = []
+        count = 0
+        reconnect = False
+        try:
+            connection.open()
+            for index, (context, to) in enumerate(items):
+                if not to:
+                    continue
+                try:
+                    message = self._build_message(
+                        context, subject, to, None, None, from_email
+                    )
+                except Exception as e:  # noqa: BLE001
+                    failures.append(EmailFailure(index, to, e))
+                    continue
+                try:
+                    if reconnect or (
+                        reconnect_every and count and count % reconnect_every == 0
+                    ):
+                        connection.close()
+                        connection.open()
+                        reconnect = False
+                    sent += connection.send_messages([message]) or 0
+                except Exception as e:  # noqa: BLE001
+                    failures.append(EmailFailure(index, to, e))
+                    reconnect = True
+                count += 1
+        finally:
+            connection.close()
+        return EmailBatchResult(sent, failures, time.perf_counter() - start)
+
     def send_async(
         self,
         context: dict[str, Any],
@@ -72,10 +493,12 @@ class Email:
         cc: list[str] | None = None,
         bcc: list[str] | None = None,
         from_email: str | None = None,
-    ) -> Thread:
+    ) -> Future:
         """
         Sends an email asynchronously using the current template and the provided context.
-        Exactly the same as `send` but returns a `Thread` object.
+        Exactly the same as `send` but runs in the shared `EmailWorkerPool` (see `get_email_pool`).
+        If `settings.EMAIL_OUTBOX` is True, the email is saved in the outbox instead
+        (see `enqueue`), and the future is already done.
 
         Args:
             context (dict[str, Any]): The context to render the template with.
@@ -85,18 +508,192 @@ class Email:
             bcc (list[str] | None, optional): The list of BCC recipients. Defaults to None.
             from_email (str | None, optional): The sender email address. Defaults to None.
 
+        Raises:
+            EmailQueueFullError: If the queue is full with the block policy and a timeout.
+
         Returns:
-            Thread: The started thread in charge of sending the email.
+            Future: The future result of the sending, which fails if the email was dropped.
         """
-        thread = Thread(
-            target=self.send, args=(context, subject, to, cc, bcc, from_email)
+        if getattr(settings, "EMAIL_OUTBOX", False):
+            future: Future = Future()
+            future.set_result(self.enqueue(context, subject, to, cc, bcc, from_email))
+            return future
+        return get_email_pool().submit(
+            self.send, context, subject, to, cc, bcc, from_email
         )
-        thread.start()
-        return thread
-
-    @staticmethod
-    def _render_template(template_path: str, context: dict[str, Any]) -> str:
-        """Renders a template with the given context."""
-        template = loader.get_template(template_path)
-        rendered = template.render(context)
+
+    def enqueue(
+        self,
+        context: dict[str, Any],
+        subject: str | None = None,
+        to: list[str] | None = None,
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+        from_email: str | None = None,
+        idempotency_key: str | None = None,
+        backend: str | None = None,
+    ) -> "OutboxEmail | None":
+        """
+        Renders the email and saves it in the outbox, without any SMTP I/O.
+        It is then sent by the `send_outbox_emails` command, with retries.
+        Requires `django_utils_kit.outbox` in `INSTALLED_APPS`.
+        Does nothing if no recipients are provided.
+
+        Args:
+            context (dict[str, Any]): The context to render the template with.
+            subject (str | None, optional): The subject of the email. Defaults to None.
+            to (list[str] | None, optional): The list of recipients. Defaults to None.
+            cc (list[str] | None, optional): The list of CC recipients. Defaults to None.
+            bcc (list[str] | None, optional): The list of BCC recipients. Defaults to None.
+            from_email (str | None, optional): The sender email address. Defaults to None.
+            idempotency_key (str | None, optional): Unique key to avoid queuing the same
+                email twice. Defaults to None (random key).
+            backend (str | None, optional): The dotted path of the email backend.
+                Defaults to None (`settings.EMAIL_BACKEND`).
+
+        Returns:
+            OutboxEmail | None: The queued email, if any.
+        """
+        from django_utils_kit.outbox.emails import enqueue_email
+
+        if not to and not cc and not bcc:
+            return None
+        email = self._build_message(context, subject, to, cc, bcc, from_email)
+        return enqueue_email(email, idempotency_key, backend)
+
+    async def asend(
+        self,
+        context: dict[str, Any],
+        subject: str | None = None,
+        to: list[str] | None = None,
+        cc: list[str] | None = None,
+        bcc: list[str] | None = None,
+        from_email: str | None = None,
+        connection: BaseAsyncEmailBackend | None = None,
+    ) -> None:
+        """
+        Async version of `send`, which delivers the email through an async transport.
+        The template is rendered in the sync thread of `sync_to_async`, where the ORM
+        (and lazy querysets from the context) can be used.
+
+        Args:
+            context (dict[str, Any]): The context to render the template with.
+            subject (str | None, optional): The subject of the email. Defaults to None.
+            to (list[str] | None, optional): The list of recipients. Defaults to None.
+            cc (list[str] | None, optional): The list of CC recipients. Defaults to None.
+            bcc (list[str] | None, optional): The list of BCC recipients. Defaults to None.
+            from_email (str | None, optional): The sender email address. Defaults to None.
+            connection (BaseAsyncEmailBackend | None, optional): The transport to use,
+                which is left open to be reused. Defaults to None (`get_async_connection()`).
+        """
+        if not to and not cc and not bcc:
+            return
+        email = await sync_to_async(self._build_message)(
+            context, subject, to, cc, bcc, from_email
+        )
+        # Transports only close the connections they opened themselves
+        connection = connection or get_async_connection()
+        await connection.send_messages([email])
+
+    async def asend_many(
+        self,
+        items: Iterable[tuple[dict[str, Any], list[str]]],
+        subject: str | None = None,
+        from_email: str | None = None,
+        concurrency: int = EMAIL_ASYNC_CONCURRENCY,
+        backend: str | None = None,
+    ) -> EmailBatchResult:
+        """
+        Async version of `send_many`, which sends the emails over `concurrency` connections
+        of the async transport at the same time, without a thread per email.
+        Each connection is reopened after a sending failure.
+
+        Args:
+            items (Iterable[tuple[dict[str, Any], list[str]]]): The contexts and their recipients.
+            subject (str | None, optional): The subject of the emails. Defaults to None.
+            from_email (str | None, optional): The sender email address. Defaults to None.
+            concurrency (int, optional): The number of connections.
+                Defaults to EMAIL_ASYNC_CONCURRENCY.
+            backend (str | None, optional): The dotted path of the transport.
+                Defaults to None (see `get_async_connection`).
+
+        Returns:
+            EmailBatchResult: The number of sent emails, the failures, and the duration.
+        """
+        start = time.perf_counter()
+        queue: asyncio.Queue[tuple[int, dict[str, Any], list[str]]] = asyncio.Queue()
+        for index, (context, to) in enumerate(items):
+            if to:
+                queue.put_nowait((index, context, to))
+        sent = 0
+        failures: list[EmailFailure] = []
+        connection_errors: list[Exception] = []
+        build_message = sync_to_async(self._build_message)
+
+        async def worker() -> None:
+            nonlocal sent
+            try:
+                connection = get_async_connection(backend)
+                await connection.open()
+            except Exception as e:  # noqa: BLE001
+                # Other workers take over, or the remaining emails fail below
+                connection_errors.append(e)
+                return
+            reconnect = False
+            try:
+                while not queue.empty():
+                    index, context, to = queue.get_nowait()
+                    try:
+                        message = await build_message(
+                            context, subject, to, None, None, from_email
+                        )
+                    except Exception as e:  # noqa: BLE001
+                        failures.append(EmailFailure(index, to, e))
+                        continue
+                    try:
+                        if reconnect:
+                            await connection.close()
+                            await connection.open()
+                            reconnect = False
+                        count = await connection.send_messages([message])
+                        sent += count
+                    except Exception as e:  # noqa: BLE001
+                        failures.append(EmailFailure(index, to, e))
+                        reconnect = True
+            finally:
+                await connection.close()
+
+        await asyncio.gather(
+            *(worker() for _ in range(min(concurrency, queue.qsize())))
+        )
+        while not queue.empty():
+            index, _, to = queue.get_nowait()
+            failures.append(EmailFailure(index, to, connection_errors[-1]))
+        failures.sort(key=lambda failure: failure.index)
+        return EmailBatchResult(sent, failures, time.perf_counter() - start)
+
+    def _build_message(
+        self,
+        context: dict[str, Any],
+        subject: str | None,
+        to: list[str] | None,
+        cc: list[str] | None,
+        bcc: list[str] | None,
+        from_email: str | None,
+    ) -> EmailMessage:
+        """Builds the html email from the template and the context."""
+        email = EmailMessage(
+            subject=subject or self.default_subject,
+            body=self._render_template(context),
+            to=to or [],
+            cc=cc or [],
+            bcc=bcc or [],
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        )
+        email.content_subtype = "html"
+        return email
+
+    def _render_template(self, context: dict[str, Any]) -> str:
+        """Renders the template with the given context."""
+        rendered = self.get_template().render(context)
         return rendered
@@ -1,49 +1,1044 @@
 """Utilities for handling files with DRF."""
 
-from io import BytesIO
-from urllib.parse import urlparse
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+from io import BytesIO, RawIOBase
+from itertools import islice
+import json
+import mimetypes
+import os
+import re
+from tempfile import TemporaryFile
+from time import monotonic, perf_counter, sleep, time
+from typing import IO, Any
+from urllib.parse import quote, urlparse
+import uuid
 import zipfile
 
-from django.core.files.storage import Storage
-from django.http import HttpResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.dispatch import Signal
+from django.http import (
+    FileResponse,
+    HttpRequest,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
 
+ASYNC_BATCH_SIZE = 16
+CHUNK_SIZE = 64 * 1024
+PREFETCH_MAX_BYTES = 16 * 1024 * 1024
+MAX_RANGES = 16
+RANGE_SPEC_REGEX = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+# Zip compression method storing already-compressed files and deflating the others
+ZIP_AUTO = -1
+ZIP_CACHE_DIR = "zip_cache"
+ZIP_CACHE_LOCK_TIMEOUT = 300
+ZIP_CACHE_POLL_INTERVAL = 0.5
+ZIP_MANIFEST_NAME = "MANIFEST.json"
+# Zip entry naming strategies
+ZIP_NAMES_BASENAME = "basename"
+ZIP_NAMES_PATH = "path"
+ZIP_STORED_EXTENSIONS = {
+    "7z",
+    "avif",
+    "bz2",
+    "gif",
+    "gz",
+    "heic",
+    "jpeg",
+    "jpg",
+    "m4a",
+    "mkv",
+    "mov",
+    "mp3",
+    "mp4",
+    "png",
+    "rar",
+    "tgz",
+    "webm",
+    "webp",
+    "xz",
+    "zip",
+    "zst",
+}
 
-def download_file(path: str, storage: Storage) -> StreamingHttpResponse:
+# Sent once a download response is closed, with the `filename`, `status_code`,
+# `bytes_sent`, `time_to_first_byte`, `duration` and `aborted` arguments
+download_finished = Signal()
+# Sent once a file is zipped, with the `name`, `path`, `size`, `compress_size`,
+# `read_time` (reading from the storage) and `write_time` (compressing) arguments
+zip_entry_written = Signal()
+
+
+class _FileChunks:
+    """
+    Iterates over a file by chunks read into a single reused buffer.
+    The file is closed once exhausted, or when closed by the response.
+    """
+
+    def __init__(self, file: IO[bytes], chunk_size: int) -> None:
+        self.file = file
+        self.chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[bytes | memoryview]:
+        try:
+            yield from _read_chunks(self.file, self.chunk_size)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _InstrumentedContent:
+    """Streaming content sending the `download_finished` signal once closed."""
+
+    def __init__(
+        self,
+        content: Iterator[bytes],
+        sender: Callable[..., Any],
+        filename: str,
+        status_code: int,
+        started_at: float,
+    ) -> None:
+        self.content = content
+        self.sender = sender
+        self.filename = filename
+        self.status_code = status_code
+        self.started_at = started_at
+        self.bytes_sent = 0
+        self.first_byte_at: float | None = None
+        self.completed = False
+        self.closed = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.content:
+            if self.first_byte_at is None:
+                self.first_byte_at = perf_counter()
+            self.bytes_sent += len(chunk)
+            yield chunk
+        self.completed = True
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        ttfb = None
+        if self.first_byte_at is not None:
+            ttfb = self.first_byte_at - self.started_at
+        download_finished.send(
+            sender=self.sender,
+            filename=self.filename,
+            status_code=self.status_code,
+            bytes_sent=self.bytes_sent,
+            time_to_first_byte=ttfb,
+            duration=perf_counter() - self.started_at,
+            aborted=not self.completed,
+        )
+
+
+class _PrefetchedFile(RawIOBase):
+    """File-like object that serves the prefetched bytes, then the rest of the file."""
+
+    def __init__(self, head: bytes, file: IO[bytes] | None) -> None:
+        super().__init__()
+        self._head = BytesIO(head)
+        self._file = file
+        self.size = len(head) if file is None else getattr(file, "size", None)
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._head.read(size)
+        if self._file is not None and (size < 0 or len(data) < size):
+            data += self._file.read(size - len(data) if size >= 0 else -1)
+        return data
+
+    def readinto(self, buffer: memoryview) -> int:  # ty: ignore
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        self._head.close()
+        if self._file is not None:
+            self._file.close()
+        super().close()
+
+
+class _ZipStream:
+    """Unseekable write-only buffer, drained as the zip-file is being built."""
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        """Returns and clears the bytes written since the last drain."""
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+async def adownload_file(
+    path: str,
+    storage: Storage,
+    request: HttpRequest | None = None,
+    offload: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+    batch_size: int = ASYNC_BATCH_SIZE,
+) -> HttpResponse | StreamingHttpResponse:
+    """
+    Async version of `download_file`, returning the same response and headers.
+    The content is streamed through an async iterator that reads `batch_size` chunks
+    at a time in a thread, only when the client has consumed the previous batch.
+
+    Args:
+        path (str): path to the file
+        storage (Storage): storage backend
+        request (HttpRequest | None, optional): the current request. Defaults to None.
+        offload (bool, optional): whether to offload local files. Defaults to False.
+        chunk_size (int, optional): bytes read from the storage at once.
+            Defaults to CHUNK_SIZE.
+        batch_size (int, optional): chunks read per thread call.
+            Defaults to ASYNC_BATCH_SIZE.
+
+    Returns:
+        HttpResponse | StreamingHttpResponse: the response containing the file
+    """
+    response = await sync_to_async(download_file, thread_sensitive=False)(
+        path, storage, request, offload, chunk_size
+    )
+    return _make_async_response(response, batch_size)
+
+
+async def adownload_files_as_zip(
+    paths: list[str],
+    output_filename: str,
+    storage: Storage,
+    stream: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+    prefetch: int = 0,
+    prefetch_max_bytes: int = PREFETCH_MAX_BYTES,
+    compression: int | None = None,
+    compresslevel: int | None = None,
+    cache_storage: Storage | None = None,
+    cache_max_size: int | None = None,
+    names: str | dict[str, str] = ZIP_NAMES_BASENAME,
+    manifest: bool = False,
+    batch_size: int = ASYNC_BATCH_SIZE,
+) -> HttpResponse | StreamingHttpResponse:
+    """
+    Async version of `download_files_as_zip`, returning the same response and headers.
+    When streaming, the zip-file is built through an async iterator that writes
+    `batch_size` chunks at a time in a thread, only when the client has consumed
+    the previous batch.
+
+    Args:
+        paths (list[str]): paths to the files
+        output_filename (str): name of the generated and to-be-downloaded zip-file
+        storage (Storage): storage backend
+        stream (bool, optional): whether to stream the zip-file. Defaults to False.
+        chunk_size (int, optional): bytes read from the storage at once when streaming.
+            Defaults to CHUNK_SIZE.
+        prefetch (int, optional): number of files to fetch ahead, 0 to disable.
+            Defaults to 0.
+        prefetch_max_bytes (int, optional): max bytes held by prefetched files.
+            Defaults to PREFETCH_MAX_BYTES.
+        compression (int | None, optional): `zipfile` compression method, or ZIP_AUTO.
+            Defaults to `settings.ZIP_COMPRESSION` or ZIP_STORED.
+        compresslevel (int | None, optional): compression level of the method.
+            Defaults to `settings.ZIP_COMPRESSLEVEL` or the method default.
+        cache_storage (Storage | None, optional): storage where to cache the zip-file.
+            Defaults to None.
+        cache_max_size (int | None, optional): max bytes of cached zip-files.
+            Defaults to `settings.ZIP_CACHE_MAX_SIZE` or None (no limit).
+        names (str | dict[str, str], optional): ZIP_NAMES_BASENAME, ZIP_NAMES_PATH,
+            or a mapping of paths to entry names. Defaults to ZIP_NAMES_BASENAME.
+        manifest (bool, optional): whether to add a manifest. Defaults to False.
+        batch_size (int, optional): chunks written per thread call.
+            Defaults to ASYNC_BATCH_SIZE.
+
+    Returns:
+        HttpResponse | StreamingHttpResponse: the response containing the zip-file
+    """
+    response = await sync_to_async(download_files_as_zip, thread_sensitive=False)(
+        paths,
+        output_filename,
+        storage,
+        stream=stream,
+        chunk_size=chunk_size,
+        prefetch=prefetch,
+        prefetch_max_bytes=prefetch_max_bytes,
+        compression=compression,
+        compresslevel=compresslevel,
+        cache_storage=cache_storage,
+        cache_max_size=cache_max_size,
+        names=names,
+        manifest=manifest,
+    )
+    return _make_async_response(response, batch_size)
+
+
+def download_file(
+    path: str,
+    storage: Storage,
+    request: HttpRequest | None = None,
+    offload: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+) -> HttpResponse | StreamingHttpResponse:
     """
     Downloads a file from a storage backend.
+    Sets the `Content-Length`, `Last-Modified` and `ETag` headers when the storage
+    provides the file size and modified time. When the `request` is provided,
+    conditional requests may return a 304/412 response and `Range` requests
+    return a 206 response (single or multipart) by seeking in the storage file.
+    The file is streamed by chunks of `chunk_size` bytes, and closed with the response.
+
+    When `offload` is True and the storage is a `FileSystemStorage`, the transfer
+    is offloaded from the Python worker:
+    - If `settings.DOWNLOAD_OFFLOAD_HEADER` is set (like "X-Accel-Redirect" for nginx
+      or "X-Sendfile" for Apache), an empty response with that header is returned.
+      Its value is the absolute file path, or its URL if the file is within one of the
+      `settings.DOWNLOAD_OFFLOAD_LOCATIONS` (mapping of directories to URL prefixes)
+    - Otherwise, a `FileResponse` is returned so that the server can use `sendfile`
+      (except for `Range` requests, which are handled as usual)
+
+    If it has receivers, the `download_finished` signal is sent once the response
+    is closed (or right away if the response is not streamed through Python).
 
     Args:
         path (str): path to the file
         storage (Storage): storage backend
+        request (HttpRequest | None, optional): the current request. Defaults to None.
+        offload (bool, optional): whether to offload local files. Defaults to False.
+        chunk_size (int, optional): bytes read from the storage at once.
+            Defaults to CHUNK_SIZE.
 
     Returns:
-        StreamingHttpResponse: the streaming response containing the file
+        HttpResponse | StreamingHttpResponse: the response containing the file
     """
-    filename = urlparse(path).path.split("/").pop()
-    response = StreamingHttpResponse(streaming_content=storage.open(path))
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    return response
+    started_at = perf_counter()
+    response = _get_file_response(path, storage, request, offload, chunk_size)
+    return _instrument_response(
+        response, download_file, _get_filename(path), started_at
+    )
 
 
 def download_files_as_zip(
-    paths: list[str], output_filename: str, storage: Storage
-) -> HttpResponse:
+    paths: list[str],
+    output_filename: str,
+    storage: Storage,
+    stream: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+    prefetch: int = 0,
+    prefetch_max_bytes: int = PREFETCH_MAX_BYTES,
+    compression: int | None = None,
+    compresslevel: int | None = None,
+    cache_storage: Storage | None = None,
+    cache_max_size: int | None = None,
+    names: str | dict[str, str] = ZIP_NAMES_BASENAME,
+    manifest: bool = False,
+) -> HttpResponse | StreamingHttpResponse:
     """
     Downloads a zip-file from a storage backend.
+    When `stream` is True, the zip-file is built chunk by chunk as the client reads it
+    (using zip64 entries with data descriptors) so memory usage is bounded by `chunk_size`.
+    When `prefetch` is set, the next files are opened and read in a thread pool
+    while the current one is being zipped. Each prefetched file buffers at most
+    its share of `prefetch_max_bytes`, its remainder being read when zipped,
+    so a slow or large file never blocks the other workers.
+    With the ZIP_AUTO compression, files with a ZIP_STORED_EXTENSIONS extension
+    are stored as-is as they are already compressed, and the others are deflated.
+
+    Each file is named after its filename (ZIP_NAMES_BASENAME), its path (ZIP_NAMES_PATH),
+    or the name mapped to its path. Duplicate names get a " (1)", " (2)"... suffix.
+    When `manifest` is True, a ZIP_MANIFEST_NAME entry is added at the end,
+    listing the name, path, size, CRC32 and SHA-256 of each file,
+    computed while the files are being zipped.
+
+    When a `cache_storage` is provided, the zip-file is built once in that storage
+    (under ZIP_CACHE_DIR) and then streamed from it. Its name is derived from the paths
+    (in order), their entry names, size and modified time, and the compression
+    options. If the storage cannot provide the size or modified time of a file,
+    the zip-file is built without caching, as a change could not be detected.
+    Concurrent requests for the same zip-file wait for it to be built,
+    using a lock in the default Django cache, which also records when each zip-file
+    was last used. Once `cache_max_size` is exceeded, the least recently used
+    zip-files are deleted from the storage.
+
+    If it has receivers, the `zip_entry_written` signal is sent after each file
+    is zipped, and the `download_finished` signal once the response is closed.
 
     Args:
         paths (list[str]): paths to the files
         output_filename (str): name of the generated and to-be-downloaded zip-file
         storage (Storage): storage backend
+        stream (bool, optional): whether to stream the zip-file. Defaults to False.
+        chunk_size (int, optional): bytes read from the storage at once when streaming.
+            Defaults to CHUNK_SIZE.
+        prefetch (int, optional): number of files to fetch ahead, 0 to disable.
+            Defaults to 0.
+        prefetch_max_bytes (int, optional): max bytes held by prefetched files.
+            Defaults to PREFETCH_MAX_BYTES.
+        compression (int | None, optional): `zipfile` compression method, or ZIP_AUTO.
+            Defaults to `settings.ZIP_COMPRESSION` or ZIP_STORED.
+        compresslevel (int | None, optional): compression level of the method.
+            Defaults to `settings.ZIP_COMPRESSLEVEL` or the method default.
+        cache_storage (Storage | None, optional): storage where to cache the zip-file.
+            Defaults to None.
+        cache_max_size (int | None, optional): max bytes of cached zip-files.
+            Defaults to `settings.ZIP_CACHE_MAX_SIZE` or None (no limit).
+        names (str | dict[str, str], optional): ZIP_NAMES_BASENAME, ZIP_NAMES_PATH,
+            or a mapping of paths to entry names. Defaults to ZIP_NAMES_BASENAME.
+        manifest (bool, optional): whether to add a manifest. Defaults to False.
 
     Returns:
-        HttpResponse: the response containing the zip-file
+        HttpResponse | StreamingHttpResponse: the response containing the zip-file
     """
-    content = BytesIO()
-    with zipfile.ZipFile(content, "w") as zf:
-        for path in paths:
-            filename = urlparse(path).path.split("/").pop()
-            zf.writestr(filename, storage.open(path).read())
-    response = HttpResponse(content.getvalue())
+    started_at = perf_counter()
+    response: HttpResponse | StreamingHttpResponse | None = None
+    if compression is None:
+        compression = getattr(settings, "ZIP_COMPRESSION", zipfile.ZIP_STORED)
+    if compresslevel is None:
+        compresslevel = getattr(settings, "ZIP_COMPRESSLEVEL", None)
+    entry_names = _get_entry_names(paths, names, manifest)
+    # Lazy generator: nothing is read until it is iterated over
+    sources = _open_files(paths, storage, prefetch, prefetch_max_bytes)
+    zip_args = (entry_names, sources, chunk_size, compression, compresslevel, manifest)
+    if cache_storage is not None:
+        if cache_max_size is None:
+            cache_max_size = getattr(settings, "ZIP_CACHE_MAX_SIZE", None)
+        key = _get_zip_cache_key(
+            paths, entry_names, storage, compression, compresslevel, manifest
+        )
+        name = None
+        if key is not None:
+            name = _get_or_build_cached_zip(
+                key,
+                lambda file: _build_zip(file, *zip_args),
+                cache_storage,
+                cache_max_size,
+            )
+        if name is not None:
+            response = _get_file_response(name, cache_storage, None, False, chunk_size)
+            response["Content-Type"] = "application/zip"
+    if response is None:
+        if stream:
+            response = StreamingHttpResponse(
+                streaming_content=_stream_zip(*zip_args),
+                content_type="application/zip",
+            )
+        else:
+            content = BytesIO()
+            _build_zip(content, *zip_args)
+            response = HttpResponse(content.getvalue())
     response["Content-Disposition"] = f'attachment; filename="{output_filename}"'
+    return _instrument_response(
+        response, download_files_as_zip, output_filename, started_at
+    )
+
+
+async def _aiter_batches(
+    iterator: Iterator[bytes], batch_size: int
+) -> AsyncIterator[bytes]:
+    """Consumes a blocking iterator in a thread, `batch_size` items at a time."""
+    next_batch = sync_to_async(
+        lambda: list(islice(iterator, batch_size)), thread_sensitive=False
+    )
+    while batch := await next_batch():
+        for item in batch:
+            yield item
+
+
+def _build_zip(
+    file: IO[bytes],
+    names: list[str],
+    sources: Iterator[tuple[str, IO[bytes]]],
+    chunk_size: int,
+    compression: int,
+    compresslevel: int | None,
+    manifest: bool,
+) -> None:
+    """Writes the whole zip-file into a seekable file, without data descriptors."""
+    deque(
+        _write_zip(
+            file, names, sources, chunk_size, compression, compresslevel, manifest
+        ),
+        maxlen=0,
+    )
+
+
+def _evict_cached_zips(storage: Storage, max_size: int, keep: str) -> None:
+    """
+    Deletes the least recently used zip-files until `max_size` is respected.
+    Zip-files without a recorded use (e.g. evicted from the Django cache)
+    are ordered by their modified time.
+    """
+    filenames = storage.listdir(ZIP_CACHE_DIR)[1]
+    used_keys = {
+        filename: _get_zip_cache_used_key(os.path.splitext(filename)[0])
+        for filename in filenames
+    }
+    used_times = cache.get_many(used_keys.values())
+    entries = []
+    for filename in filenames:
+        name = f"{ZIP_CACHE_DIR}/{filename}"
+        used_at = used_times.get(used_keys[filename])
+        if used_at is None:
+            used_at = storage.get_modified_time(name).timestamp()
+        entries.append((used_at, storage.size(name), name, used_keys[filename]))
+    total_size = sum(size for _, size, _, _ in entries)
+    for _, size, name, used_key in sorted(entries):
+        if total_size <= max_size:
+            return
+        if name != keep:
+            cache.delete(used_key)
+            storage.delete(name)
+            total_size -= size
+
+
+def _get_compress_type(filename: str, compression: int) -> int:
+    """Resolves the compression method of a file, based on its extension for ZIP_AUTO."""
+    if compression != ZIP_AUTO:
+        return compression
+    extension = os.path.splitext(filename)[1].lstrip(".").lower()
+    if extension in ZIP_STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def _get_entry_names(
+    paths: list[str], names: str | dict[str, str], manifest: bool
+) -> list[str]:
+    """Computes the unique zip entry name of each path."""
+    used_names = {ZIP_MANIFEST_NAME} if manifest else set()
+    entry_names = []
+    for path in paths:
+        if isinstance(names, dict) and path in names:
+            name = names[path]
+        elif names == ZIP_NAMES_PATH:
+            name = urlparse(path).path.lstrip("/")
+        else:
+            name = _get_filename(path)
+        root, extension = os.path.splitext(name)
+        suffix = 1
+        while name in used_names:
+            name = f"{root} ({suffix}){extension}"
+            suffix += 1
+        used_names.add(name)
+        entry_names.append(name)
+    return entry_names
+
+
+def _get_file_modified_time(path: str, storage: Storage) -> int | None:
+    """Returns the file modified time as a timestamp, if supported by the storage."""
+    try:
+        return int(storage.get_modified_time(path).timestamp())
+    except NotImplementedError:
+        return None
+
+
+def _get_file_size(path: str, storage: Storage) -> int | None:
+    """Returns the file size, if supported by the storage."""
+    try:
+        return storage.size(path)
+    except NotImplementedError:
+        return None
+
+
+def _get_file_response(
+    path: str,
+    storage: Storage,
+    request: HttpRequest | None,
+    offload: bool,
+    chunk_size: int,
+) -> HttpResponse | StreamingHttpResponse:
+    """Builds the response of `download_file`."""
+    filename = _get_filename(path)
+    size = _get_file_size(path, storage)
+    last_modified = _get_file_modified_time(path, storage)
+    etag = None
+    if size is not None and last_modified is not None:
+        etag = quote_etag(f"{last_modified:x}-{size:x}")
+    response: HttpResponse | StreamingHttpResponse | None = None
+    if request is not None:
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+    if response is None and offload and isinstance(storage, FileSystemStorage):
+        response = _get_offload_response(path, storage, filename, request)
+    if response is None and request is not None and size is not None:
+        response = _get_range_response(
+            request, path, storage, filename, size, etag, last_modified, chunk_size
+        )
+    if response is None:
+        response = StreamingHttpResponse(
+            streaming_content=_FileChunks(storage.open(path), chunk_size)
+        )
+        if size is not None:
+            response["Content-Length"] = size
+    if size is not None:
+        response["Accept-Ranges"] = "bytes"
+    if etag is not None:
+        response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _get_filename(path: str) -> str:
+    """Extracts the filename from a storage path or URL."""
+    return urlparse(path).path.split("/").pop()
+
+
+def _instrument_response(
+    response: HttpResponse | StreamingHttpResponse,
+    sender: Callable[..., Any],
+    filename: str,
+    started_at: float,
+) -> HttpResponse | StreamingHttpResponse:
+    """Sends the `download_finished` signal for the response, if it has receivers."""
+    if not download_finished.has_listeners(sender):
+        return response
+    if isinstance(response, StreamingHttpResponse) and not isinstance(
+        response, FileResponse
+    ):
+        response.streaming_content = _InstrumentedContent(
+            iter(response.streaming_content),
+            sender,
+            filename,
+            response.status_code,
+            started_at,
+        )
+        return response
+    if isinstance(response, FileResponse):
+        bytes_sent = int(response.get("Content-Length", 0))
+    else:
+        bytes_sent = len(response.content)
+    duration = perf_counter() - started_at
+    download_finished.send(
+        sender=sender,
+        filename=filename,
+        status_code=response.status_code,
+        bytes_sent=bytes_sent,
+        time_to_first_byte=duration,
+        duration=duration,
+        aborted=False,
+    )
+    return response
+
+
+def _get_offload_response(
+    path: str,
+    storage: FileSystemStorage,
+    filename: str,
+    request: HttpRequest | None,
+) -> HttpResponse | StreamingHttpResponse | None:
+    """Builds the response delegating the transfer to the server, if possible."""
+    file_path = os.path.abspath(storage.path(path))
+    header = getattr(settings, "DOWNLOAD_OFFLOAD_HEADER", None)
+    locations: dict[str, str] = getattr(settings, "DOWNLOAD_OFFLOAD_LOCATIONS", {})
+    if header:
+        value: str | None = file_path
+        if locations:
+            value = _get_offload_url(file_path, locations)
+        if value is not None:
+            response = HttpResponse(
+                content_type=mimetypes.guess_type(filename)[0]
+                or "application/octet-stream"
+            )
+            response[header] = value
+            return response
+    if request is not None and "Range" in request.headers:
+        return None
+    return FileResponse(open(file_path, "rb"), as_attachment=True, filename=filename)
+
+
+def _get_offload_url(file_path: str, locations: dict[str, str]) -> str | None:
+    """Maps the file path to the URL of the deepest location containing it."""
+    for directory in sorted(locations, key=len, reverse=True):
+        directory_path = os.path.abspath(directory)
+        if os.path.commonpath([directory_path, file_path]) == directory_path:
+            relative_path = os.path.relpath(file_path, directory_path)
+            prefix = locations[directory].rstrip("/")
+            return f"{prefix}/{quote(relative_path.replace(os.sep, '/'))}"
+    return None
+
+
+def _get_or_build_cached_zip(
+    key: str,
+    build_zip: Callable[[IO[bytes]], None],
+    storage: Storage,
+    max_size: int | None,
+) -> str | None:
+    """
+    Returns the name of the cached zip-file, building it first if needed.
+    Returns None if another process did not finish building it in time.
+    The file exists in the storage while it is being saved, so it is only served
+    once its last use is recorded in the Django cache, after the save.
+    """
+    name = f"{ZIP_CACHE_DIR}/{key}.zip"
+    lock_key = f"django_utils_kit:zip_cache:{key}"
+    used_key = _get_zip_cache_used_key(key)
+    deadline = monotonic() + ZIP_CACHE_LOCK_TIMEOUT
+    while not _is_cached_zip_ready(name, used_key, storage):
+        if cache.add(lock_key, True, ZIP_CACHE_LOCK_TIMEOUT):
+            try:
+                if not _is_cached_zip_ready(name, used_key, storage):
+                    # Incomplete or no longer recorded
+                    if storage.exists(name):
+                        storage.delete(name)
+                    with TemporaryFile() as file:
+                        build_zip(file)
+                        file.seek(0)
+                        name = storage.save(name, File(file))
+                    cache.set(used_key, time(), None)
+                    if max_size is not None:
+                        _evict_cached_zips(storage, max_size, name)
+            finally:
+                cache.delete(lock_key)
+            break
+        if monotonic() > deadline:
+            return None
+        sleep(ZIP_CACHE_POLL_INTERVAL)
+    cache.set(used_key, time(), None)
+    return name
+
+
+def _get_range_response(
+    request: HttpRequest,
+    path: str,
+    storage: Storage,
+    filename: str,
+    size: int,
+    etag: str | None,
+    last_modified: int | None,
+    chunk_size: int,
+) -> HttpResponse | StreamingHttpResponse | None:
+    """Builds the 206/416 response for a `Range` request, or None to send the full file."""
+    header = request.headers.get("Range")
+    if header is None or not _if_range_matches(request, etag, last_modified):
+        return None
+    ranges = _parse_range_header(header, size)
+    if ranges is None:
+        return None
+    response: HttpResponse | StreamingHttpResponse
+    if len(ranges) == 0:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(
+            streaming_content=_stream_ranges(
+                path, storage, ranges, [], b"", chunk_size
+            ),
+            status=206,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+        return response
+    boundary = uuid.uuid4().hex
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    part_headers = [
+        (
+            f"--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        for start, end in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode()
+    response = StreamingHttpResponse(
+        streaming_content=_stream_ranges(
+            path, storage, ranges, part_headers, closing, chunk_size
+        ),
+        status=206,
+        content_type=f"multipart/byteranges; boundary={boundary}",
+    )
+    response["Content-Length"] = sum(
+        len(part_header) + end - start + 3
+        for part_header, (start, end) in zip(part_headers, ranges)
+    ) + len(closing)
     return response
+
+
+def _get_zip_cache_key(
+    paths: list[str], entry_names: list[str], storage: Storage, *options: Any
+) -> str | None:
+    """
+    Hashes the entries in request order, with their path and metadata, and the zip options.
+    The order matters as it decides the entry order and the suffixes of duplicate names.
+    Returns None if the size or modified time of a file is not supported by the storage.
+    """
+    digest = hashlib.sha256(repr(options).encode())
+    for path, entry_name in zip(paths, entry_names):
+        size = _get_file_size(path, storage)
+        modified_time = _get_file_modified_time(path, storage)
+        if size is None or modified_time is None:
+            return None
+        digest.update(f"\n{entry_name}|{path}|{size}|{modified_time}".encode())
+    return digest.hexdigest()
+
+
+def _get_zip_cache_used_key(key: str) -> str:
+    """Returns the Django cache key recording when a complete cached zip-file was last used."""
+    return f"django_utils_kit:zip_cache_used:{key}"
+
+
+def _is_cached_zip_ready(name: str, used_key: str, storage: Storage) -> bool:
+    """Checks that a cached zip-file was completely saved and still exists."""
+    return cache.get(used_key) is not None and storage.exists(name)
+
+
+def _if_range_matches(
+    request: HttpRequest, etag: str | None, last_modified: int | None
+) -> bool:
+    """Checks the `If-Range` header, if any, against the current file validators."""
+    header = request.headers.get("If-Range")
+    if header is None:
+        return True
+    if header.startswith(('"', "W/")):
+        return etag is not None and header == etag
+    return last_modified is not None and parse_http_date_safe(header) == last_modified
+
+
+def _parse_range_header(header: str, size: int) -> list[tuple[int, int]] | None:
+    """
+    Parses a `Range` header into a list of inclusive (start, end) byte positions.
+    Returns None if the header is invalid and must be ignored,
+    or an empty list if none of the ranges can be satisfied.
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or specs.count(",") >= MAX_RANGES:
+        return None
+    ranges = []
+    for spec in specs.split(","):
+        match = RANGE_SPEC_REGEX.match(spec)
+        if match is None:
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            end = min(int(last), size - 1) if last else size - 1
+        elif last:
+            start, end = max(size - int(last), 0), size - 1
+            if int(last) == 0:
+                continue
+        else:
+            return None
+        if start < size:
+            ranges.append((start, end))
+    return ranges
+
+
+def _read_chunks(
+    file: IO[bytes], chunk_size: int, length: int | None = None
+) -> Iterator[bytes | memoryview]:
+    """
+    Yields the file content by chunks, up to `length` bytes if provided.
+    When the file supports `readinto`, chunks are views over a single reused buffer
+    and are therefore only valid until the next iteration.
+    """
+    readinto = getattr(file, "readinto", None)
+    buffer = memoryview(bytearray(chunk_size))
+    while length is None or length > 0:
+        size = chunk_size if length is None else min(chunk_size, length)
+        chunk: bytes | memoryview
+        if readinto is not None:
+            chunk = buffer[: readinto(buffer[:size]) or 0]
+        else:
+            chunk = file.read(size)
+        if not chunk:
+            return
+        if length is not None:
+            length -= len(chunk)
+        yield chunk
+
+
+def _stream_ranges(
+    path: str,
+    storage: Storage,
+    ranges: list[tuple[int, int]],
+    part_headers: list[bytes],
+    closing: bytes,
+    chunk_size: int,
+) -> Iterator[bytes | memoryview]:
+    """Yields the requested ranges of the file, with multipart headers if provided."""
+    with storage.open(path) as file:
+        for i, (start, end) in enumerate(ranges):
+            if part_headers:
+                yield part_headers[i]
+            file.seek(start)
+            yield from _read_chunks(file, chunk_size, end - start + 1)
+            if part_headers:
+                yield b"\r\n"
+    if closing:
+        yield closing
+
+
+def _make_async_response(
+    response: HttpResponse | StreamingHttpResponse, batch_size: int
+) -> HttpResponse | StreamingHttpResponse:
+    """Replaces the streaming content of a response with an async iterator."""
+    if isinstance(response, StreamingHttpResponse) and not response.is_async:
+        # The sync iterator copies each chunk, making it safe to read them by batches
+        iterator = iter(response.streaming_content)
+        response.streaming_content = _aiter_batches(iterator, batch_size)
+    return response
+
+
+def _open_files(
+    paths: list[str], storage: Storage, prefetch: int, prefetch_max_bytes: int
+) -> Iterator[tuple[str, IO[bytes]]]:
+    """Yields the opened files in order, optionally prefetching the next ones."""
+    if prefetch <= 0:
+        for path in paths:
+            yield path, storage.open(path)
+        return
+    # The file being zipped counts towards the limit as well
+    buffer_size = max(prefetch_max_bytes // (prefetch + 1), 1)
+    pending_paths = iter(paths)
+    futures: deque[tuple[str, Future[_PrefetchedFile]]] = deque()
+    executor = ThreadPoolExecutor(max_workers=prefetch)
+    try:
+        for path in islice(pending_paths, prefetch):
+            futures.append(
+                (path, executor.submit(_prefetch_file, path, storage, buffer_size))
+            )
+        while futures:
+            path, future = futures.popleft()
+            file = future.result()
+            for next_path in islice(pending_paths, 1):
+                futures.append(
+                    (
+                        next_path,
+                        executor.submit(
+                            _prefetch_file, next_path, storage, buffer_size
+                        ),
+                    )
+                )
+            yield path, file  # ty: ignore
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        for _, future in futures:
+            if not future.cancelled() and future.exception() is None:
+                future.result().close()
+
+
+def _prefetch_file(path: str, storage: Storage, buffer_size: int) -> _PrefetchedFile:
+    """Opens a file and reads up to `buffer_size` bytes of it."""
+    file = storage.open(path)
+    head = file.read(buffer_size)
+    if len(head) < buffer_size:
+        file.close()
+        return _PrefetchedFile(head, None)
+    return _PrefetchedFile(head, file)
+
+
+def _stream_zip(
+    names: list[str],
+    sources: Iterator[tuple[str, IO[bytes]]],
+    chunk_size: int,
+    compression: int,
+    compresslevel: int | None,
+    manifest: bool,
+) -> Iterator[bytes]:
+    """Yields the zip-file bytes as each chunk of each file gets written."""
+    output = _ZipStream()
+    for _ in _write_zip(
+        output, names, sources, chunk_size, compression, compresslevel, manifest
+    ):
+        if data := output.drain():
+            yield data
+    yield output.drain()
+
+
+def _write_zip(
+    output: IO[bytes] | _ZipStream,
+    names: list[str],
+    sources: Iterator[tuple[str, IO[bytes]]],
+    chunk_size: int,
+    compression: int,
+    compresslevel: int | None,
+    manifest: bool,
+) -> Iterator[None]:
+    """
+    Writes the zip-file into `output`, yielding after each chunk of each file.
+    Entries of the unseekable `_ZipStream` are written with zip64 sizes,
+    as their sizes are unknown when their header is written.
+    In a seekable file, only entries known to need them are.
+    """
+    streamed = isinstance(output, _ZipStream)
+    manifest_files = []
+    instrumented = zip_entry_written.has_listeners(download_files_as_zip)
+    with zipfile.ZipFile(output, "w", compresslevel=compresslevel) as zf:  # ty: ignore
+        for name, (path, source) in zip(names, sources):
+            # New entries use the current compression method of the zip-file
+            zf.compression = _get_compress_type(name, compression)
+            digest = hashlib.sha256()
+            read_time = write_time = 0.0
+            size = getattr(source, "size", None)
+            force_zip64 = streamed or (size or 0) > zipfile.ZIP64_LIMIT
+            with source, zf.open(name, "w", force_zip64=force_zip64) as entry:
+                read_started_at = perf_counter() if instrumented else 0.0
+                for chunk in _read_chunks(source, chunk_size):
+                    if instrumented:
+                        write_started_at = perf_counter()
+                        read_time += write_started_at - read_started_at
+                    entry.write(chunk)
+                    if manifest:
+                        digest.update(chunk)
+                    if instrumented:
+                        write_time += perf_counter() - write_started_at
+                    yield
+                    if instrumented:
+                        read_started_at = perf_counter()
+            info = zf.getinfo(name)
+            if instrumented:
+                zip_entry_written.send(
+                    sender=download_files_as_zip,
+                    name=name,
+                    path=path,
+                    size=info.file_size,
+                    compress_size=info.compress_size,
+                    read_time=read_time,
+                    write_time=write_time,
+                )
+            if manifest:
+                manifest_files.append(
+                    {
+                        "name": name,
+                        "path": path,
+                        "size": info.file_size,
+                        "crc32": f"{info.CRC:08x}",
+                        "sha256": digest.hexdigest(),
+                    }
+                )
+        if manifest:
+            zf.compression = _get_compress_type(ZIP_MANIFEST_NAME, compression)
+            zf.writestr(ZIP_MANIFEST_NAME, json.dumps({"files": manifest_files}))
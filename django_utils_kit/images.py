@@ -1,9 +1,27 @@
 """Utilities for handling images within Django."""
 
 import base64
-from io import BytesIO
+from collections.abc import Generator, Iterable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from contextlib import contextmanager
+from io import BufferedReader, BytesIO
+import math
+import mmap
+import os
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any, NamedTuple
 
-from PIL import Image
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.db.models.fields.files import FieldFile
+from PIL import Image, ImageSequence
 
 IMAGE_TYPES = {
     "jpg": "JPEG",
@@ -12,38 +30,208 @@ IMAGE_TYPES = {
     "gif": "GIF",
     "tif": "TIFF",
     "tiff": "TIFF",
+    "webp": "WEBP",
+    "avif": "AVIF",
 }
 
+DEFAULT_RESAMPLE = Image.Resampling.BICUBIC
+DEFAULT_REDUCING_GAP = 2.0
+BATCH_MAX_PENDING_PER_WORKER = 2
+JPEG_MODES = {"1", "L", "RGB", "CMYK"}
+METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "icc_profile", "comment")
+BASE64_CHUNK_SIZE = 3 * 64 * 1024  # Multiple of 3 to avoid padding between chunks
+BASE64_MMAP_MIN_SIZE = 1024 * 1024  # 1 MiB
+IMAGE_BUDGET_DRAFT = "draft"
+IMAGE_BUDGET_REJECT = "reject"
+MAX_DRAFT_SCALE = 8  # JPEG files can be decoded at 1/2, 1/4 or 1/8 of their size
+ANIMATED_FORMATS = {"GIF", "PNG", "TIFF", "WEBP", "AVIF"}
+MAX_FRAMES = 1000
+MAX_FRAMES_PIXELS = 250 * 1000 * 1000  # Total pixels of all frames
+STORAGE_READ_BUFFER_SIZE = 64 * 1024  # 64 KiB
+STORAGE_SPOOL_MAX_SIZE = 8 * 1024 * 1024  # 8 MiB
 
-def downsize_and_save_image_from_path(file_path: str, width: int, height: int) -> None:
+
+class ImageTooLargeError(ValueError):
+    """Raised when an image exceeds the allowed size budget."""
+
+
+class Rendition(NamedTuple):
+    """A downsized copy of an image, saved in a storage by `generate_renditions`."""
+
+    label: str
+    name: str
+    width: int
+    height: int
+
+
+class ImageBatchResult(NamedTuple):
+    """Outcome of a single image from `downsize_and_save_images`."""
+
+    path: str
+    resized: bool
+    error: str | None
+
+
+def open_image(
+    file_path: str | IO[bytes],
+    max_pixels: int | None = None,
+    max_bytes: int | None = None,
+    policy: str | None = None,
+) -> Image.Image:
+    """
+    Opens an image lazily, after checking its size in bytes and pixels.
+    Only the header is read, so over-budget images are never decoded.
+    Used by every helper of this module.
+
+    Args:
+        file_path (str | IO[bytes]): path or file object of the image
+        max_pixels (int | None, optional): see `check_image_budget`.
+            Defaults to `settings.IMAGE_MAX_PIXELS` (no limit if unset).
+        max_bytes (int | None, optional): max size of the file, in bytes.
+            Defaults to `settings.IMAGE_MAX_BYTES` (no limit if unset).
+        policy (str | None, optional): see `check_image_budget`.
+            Defaults to `settings.IMAGE_BUDGET_POLICY` or IMAGE_BUDGET_REJECT.
+
+    Raises:
+        ImageTooLargeError: if the image exceeds the budget
+
+    Returns:
+        Image.Image: the opened image
+    """
+    img, _ = _open_image(file_path, max_pixels, max_bytes, policy)
+    return img
+
+
+def _open_image(
+    file_path: str | IO[bytes],
+    max_pixels: int | None = None,
+    max_bytes: int | None = None,
+    policy: str | None = None,
+) -> tuple[Image.Image, tuple[int, int]]:
+    """Same as `open_image`, but also returns the size from the header, before any draft."""
+    if max_bytes is None:
+        max_bytes = getattr(settings, "IMAGE_MAX_BYTES", None)
+    if max_bytes is not None:
+        size = _get_file_size(file_path)
+        if size > max_bytes:
+            raise ImageTooLargeError(f"Image has {size} bytes, max is {max_bytes}")
+    img = Image.open(file_path)
+    header_size = img.size
+    try:
+        check_image_budget(img, max_pixels, policy)
+    except ImageTooLargeError:
+        if isinstance(file_path, str):
+            img.close()
+        raise
+    return img, header_size
+
+
+def check_image_budget(
+    img: Image.Image, max_pixels: int | None = None, policy: str | None = None
+) -> None:
+    """
+    Checks that an image does not exceed the pixel budget.
+    With the IMAGE_BUDGET_DRAFT policy, over-budget JPEG files that are not loaded yet
+    are decoded at a reduced scale (draft mode) instead of being rejected.
+
+    Args:
+        img (Image.Image): Image object to check
+        max_pixels (int | None, optional): max number of pixels (width * height).
+            Defaults to `settings.IMAGE_MAX_PIXELS` (no limit if unset).
+        policy (str | None, optional): IMAGE_BUDGET_REJECT or IMAGE_BUDGET_DRAFT.
+            Defaults to `settings.IMAGE_BUDGET_POLICY` or IMAGE_BUDGET_REJECT.
+
+    Raises:
+        ImageTooLargeError: if the image exceeds the budget and cannot be reduced
+    """
+    if max_pixels is None:
+        max_pixels = getattr(settings, "IMAGE_MAX_PIXELS", None)
+    if max_pixels is None or img.width * img.height <= max_pixels:
+        return
+    if policy is None:
+        policy = getattr(settings, "IMAGE_BUDGET_POLICY", IMAGE_BUDGET_REJECT)
+    if policy == IMAGE_BUDGET_DRAFT:
+        scale = 2 ** math.ceil(
+            math.log2(math.sqrt(img.width * img.height / max_pixels))
+        )
+        if scale <= MAX_DRAFT_SCALE:
+            img.draft(None, (img.width // scale, img.height // scale))
+    pixels = img.width * img.height
+    if pixels > max_pixels:
+        raise ImageTooLargeError(f"Image has {pixels} pixels, max is {max_pixels}")
+
+
+def downsize_and_save_image_from_path(
+    file_path: str,
+    width: int,
+    height: int,
+    resample: Image.Resampling = DEFAULT_RESAMPLE,
+    reducing_gap: float | None = DEFAULT_REDUCING_GAP,
+) -> bool:
     """
     Given a image file path, downsizes it to the given dimensions while keeping its ratio.
     Does nothing if the image is already small-enough.
+    Every frame of animated images is downsized (see `downsize_frames`).
 
     Args:
         file_path (str): path to the existing image
         width (int): width to downsize to
         height (int): height to downsize to
+        resample (Image.Resampling, optional): resampling filter.
+            Defaults to DEFAULT_RESAMPLE.
+        reducing_gap (float | None, optional): JPEG files are decoded at a reduced
+            scale and images are reduced by integer factors first, as long as they stay
+            `reducing_gap` times larger than the output. `None` disables it.
+            Defaults to DEFAULT_REDUCING_GAP.
+
+    Returns:
+        bool: whether the image was resized
     """
-    img = Image.open(file_path)
-    if (img.height > height) or (img.width > width):
+    # The size check uses the header size, as `open_image` may have drafted the image
+    img, (original_width, original_height) = _open_image(file_path)
+    if (original_height > height) or (original_width > width):
+        if _is_animated(img, img.format):
+            # Frames are read lazily, so the file cannot be overwritten while encoding
+            buffered = BytesIO()
+            frames = downsize_frames(img, width, height, resample, reducing_gap)
+            encode_image(next(frames), buffered, img.format, append_images=frames)
+            img.close()
+            with open(file_path, "wb") as f:
+                f.write(buffered.getvalue())
+            return True
         output_size = (width, height)
-        img.thumbnail(output_size)
+        img.thumbnail(output_size, resample=resample, reducing_gap=reducing_gap)
         img.save(file_path)
+        return True
+    return False
 
 
-def downsize_image(img: Image.Image, max_size: int) -> tuple[bool, Image.Image]:
+def downsize_image(
+    img: Image.Image,
+    max_size: int,
+    resample: Image.Resampling = DEFAULT_RESAMPLE,
+    reducing_gap: float | None = DEFAULT_REDUCING_GAP,
+) -> tuple[bool, Image.Image]:
     """
     Resizes an image to the given max size while keeping its ratio.
     Does not save the resized image, returns it instead.
+    The pixel budget is enforced (see `check_image_budget`), but the image is never drafted:
+    over-budget images are rejected, and the given image is left unchanged.
 
     Args:
         img (Image.Image): Image object to resize
         max_size (int): max size to resize to
+        resample (Image.Resampling, optional): resampling filter.
+            Defaults to DEFAULT_RESAMPLE.
+        reducing_gap (float | None, optional): images are reduced by integer factors first,
+            as long as they stay `reducing_gap` times larger than the output.
+            The helpers opening the image also decode JPEG files at such a reduced scale.
+            `None` disables it. Defaults to DEFAULT_REDUCING_GAP.
 
     Returns:
         tuple[bool, Image.Image]: resized, image
     """
+    check_image_budget(img, policy=IMAGE_BUDGET_REJECT)
     min_length, max_length = sorted([img.width, img.height])
     resized = False
     if max_length > max_size:
@@ -51,26 +239,617 @@ def downsize_image(img: Image.Image, max_size: int) -> tuple[bool, Image.Image]:
         dimensions = (
             (max_size, factor) if img.width == max_length else (factor, max_size)
         )
-        img = img.resize(dimensions)
+        img = img.resize(dimensions, resample=resample, reducing_gap=reducing_gap)
         resized = True
     return resized, img
 
 
-def image_to_base64(file_path: str, downsize_to: int | None = None) -> bytes:
+def downsize_frames(
+    img: Image.Image,
+    width: int,
+    height: int,
+    resample: Image.Resampling = DEFAULT_RESAMPLE,
+    reducing_gap: float | None = DEFAULT_REDUCING_GAP,
+    max_frames: int | None = None,
+    max_pixels: int | None = None,
+) -> Iterator[Image.Image]:
+    """
+    Downsizes every frame of an animated image (like GIF or multi-frame TIFF)
+    to the given dimensions while keeping its ratio.
+    Frames are decoded and downsized one at a time, when iterating,
+    and keep their info (like `duration` and `loop`).
+
+    Args:
+        img (Image.Image): Image object to resize
+        width (int): width to downsize to
+        height (int): height to downsize to
+        resample (Image.Resampling, optional): resampling filter.
+            Defaults to DEFAULT_RESAMPLE.
+        reducing_gap (float | None, optional): see `downsize_image`.
+            Defaults to DEFAULT_REDUCING_GAP.
+        max_frames (int | None, optional): max number of frames.
+            Defaults to `settings.IMAGE_MAX_FRAMES` or MAX_FRAMES.
+        max_pixels (int | None, optional): max number of pixels of all frames combined.
+            Defaults to `settings.IMAGE_MAX_FRAMES_PIXELS` or MAX_FRAMES_PIXELS.
+
+    Raises:
+        ImageTooLargeError: if the image has too many frames or pixels
+
+    Returns:
+        Iterator[Image.Image]: the downsized frames
+
+    Usage:
+        >>> frames = downsize_frames(img, 200, 200)
+        >>> next(frames).save(path, save_all=True, append_images=frames)
+    """
+    if max_frames is None:
+        max_frames = getattr(settings, "IMAGE_MAX_FRAMES", MAX_FRAMES)
+    if max_pixels is None:
+        max_pixels = getattr(settings, "IMAGE_MAX_FRAMES_PIXELS", MAX_FRAMES_PIXELS)
+    n_frames = getattr(img, "n_frames", 1)
+    if n_frames > max_frames:
+        raise ImageTooLargeError(f"Image has {n_frames} frames, max is {max_frames}")
+    pixels = img.width * img.height * n_frames
+    if pixels > max_pixels:
+        raise ImageTooLargeError(f"Image has {pixels} pixels, max is {max_pixels}")
+    ratio = min(width / img.width, height / img.height, 1)
+    size = (max(round(img.width * ratio), 1), max(round(img.height * ratio), 1))
+    return _iter_downsized_frames(img, size, resample, reducing_gap)
+
+
+def image_to_base64(
+    file_path: str | IO[bytes],
+    downsize_to: int | None = None,
+    resample: Image.Resampling = DEFAULT_RESAMPLE,
+    reducing_gap: float | None = DEFAULT_REDUCING_GAP,
+    format: str | None = None,
+    quality: int | None = None,
+    optimize: bool = False,
+    progressive: bool = False,
+    strip_metadata: bool = False,
+) -> bytes:
     """
     Converts an image to base64, optionally downsizing it.
+    If the image needs neither resizing nor re-encoding, its original bytes are encoded
+    directly (memory-mapped for large files), without decoding the image.
+    Animated images keep all their frames if the output format supports it.
 
     Args:
-        file_path (str): path to the existing image
+        file_path (str | IO[bytes]): path or file object of the existing image
         downsize_to (int | None): max size to resize to
+        resample (Image.Resampling, optional): resampling filter used when downsizing.
+            Defaults to DEFAULT_RESAMPLE.
+        reducing_gap (float | None, optional): see `downsize_image`.
+            Defaults to DEFAULT_REDUCING_GAP.
+        format (str | None, optional): output format (like "WEBP" or "AVIF").
+            Defaults to None (format of the image).
+        quality (int | None, optional): encoder quality, for lossy formats.
+            Defaults to None (Pillow default).
+        optimize (bool, optional): extra encoder pass to reduce the size.
+            Defaults to False.
+        progressive (bool, optional): progressive encoding, for JPEG.
+            Defaults to False.
+        strip_metadata (bool, optional): removes EXIF, XMP, ICC profile and comments.
+            Defaults to False.
 
     Returns:
         bytes: base64 representation of the image
     """
     buffered = BytesIO()
-    image = Image.open(file_path)
-    format = image.format
+    # The header size, as the image may be drafted for the budget
+    image, header_size = _open_image(file_path)
+    output_format = get_image_format(format) if format else image.format
+    needs_resize = bool(downsize_to) and max(header_size) > downsize_to
+    needs_encoding = (
+        output_format != image.format
+        or quality is not None
+        or optimize
+        or progressive
+        or strip_metadata
+    )
+    if not needs_resize and not needs_encoding:
+        if isinstance(file_path, str):
+            image.close()
+        return _file_to_base64(file_path)
+    if _is_animated(image, output_format):
+        width, height = (downsize_to, downsize_to) if downsize_to else image.size
+        frames = downsize_frames(image, width, height, resample, reducing_gap)
+        encode_image(
+            next(frames),
+            buffered,
+            output_format,
+            quality,
+            optimize,
+            progressive,
+            strip_metadata,
+            append_images=frames,
+        )
+        return base64.b64encode(buffered.getvalue())
     if downsize_to:
-        _, image = downsize_image(image, downsize_to)
-    image.save(buffered, format=format)
+        _draft_image(image, downsize_to, reducing_gap)
+        _, image = downsize_image(image, downsize_to, resample, reducing_gap)
+    encode_image(
+        image, buffered, output_format, quality, optimize, progressive, strip_metadata
+    )
     return base64.b64encode(buffered.getvalue())
+
+
+def encode_image(
+    image: Image.Image,
+    fp: IO[bytes],
+    format: str | None,
+    quality: int | None = None,
+    optimize: bool = False,
+    progressive: bool = False,
+    strip_metadata: bool = False,
+    append_images: Iterable[Image.Image] | None = None,
+) -> None:
+    """
+    Saves an image in a file object, with the given encoder options.
+    Images are converted to RGB when their mode is not supported by JPEG.
+
+    Args:
+        image (Image.Image): Image object to save
+        fp (IO[bytes]): file object to write to
+        format (str | None): output format, like "JPEG" or "WEBP"
+        quality (int | None, optional): encoder quality, for lossy formats.
+            Defaults to None (Pillow default).
+        optimize (bool, optional): extra encoder pass to reduce the size.
+            Defaults to False.
+        progressive (bool, optional): progressive encoding, for JPEG.
+            Defaults to False.
+        strip_metadata (bool, optional): removes EXIF, XMP, ICC profile and comments.
+            Defaults to False.
+        append_images (Iterable[Image.Image] | None, optional): next frames of an
+            animated image, which can be lazy. Defaults to None.
+    """
+    if format == "JPEG" and image.mode not in JPEG_MODES:
+        image = image.convert("RGB")
+    options: dict[str, Any] = {}
+    if quality is not None:
+        options["quality"] = quality
+    if optimize:
+        options["optimize"] = True
+    if progressive:
+        options["progressive"] = True
+    if append_images is not None:
+        options["save_all"] = True
+        options["append_images"] = append_images
+    info = image.info
+    if strip_metadata:
+        image.info = {k: v for k, v in info.items() if k not in METADATA_KEYS}
+    try:
+        image.save(fp, format=format, **options)
+    finally:
+        image.info = info
+
+
+def get_image_format(format: str) -> str:
+    """
+    Gets the Pillow name of an image format, from its name or extension.
+
+    Args:
+        format (str): format name or extension, like "webp" or "jpg"
+
+    Returns:
+        str: the Pillow format name, like "WEBP" or "JPEG"
+
+    Raises:
+        ValueError: if Pillow cannot save images in this format
+    """
+    name = IMAGE_TYPES.get(format.lower(), format.upper())
+    if not is_format_supported(name):
+        raise ValueError(f"Unsupported image format: {format}")
+    return name
+
+
+def is_format_supported(format: str) -> bool:
+    """
+    Checks if the Pillow build can save images in the given format.
+    AVIF, for instance, requires Pillow to be built with libavif.
+
+    Args:
+        format (str): Pillow format name, like "WEBP" or "AVIF"
+
+    Returns:
+        bool: whether the format is supported
+    """
+    Image.init()
+    return format.upper() in Image.SAVE
+
+
+def get_image_mime_type(format: str) -> str | None:
+    """
+    Gets the MIME type of an image format.
+
+    Args:
+        format (str): Pillow format name, like "WEBP" or "AVIF"
+
+    Returns:
+        str | None: the MIME type, like "image/webp"
+    """
+    Image.init()
+    return Image.MIME.get(format.upper())
+
+
+def downsize_and_save_image_from_storage(
+    file: str | FieldFile,
+    width: int,
+    height: int,
+    storage: Storage | None = None,
+    resample: Image.Resampling = DEFAULT_RESAMPLE,
+    reducing_gap: float | None = DEFAULT_REDUCING_GAP,
+) -> bool:
+    """
+    Same as `downsize_and_save_image_from_path`, but for a file in a Django storage.
+    The image is read through a bounded buffer, and only written back
+    (through `storage.save`) if it had to be resized.
+
+    Args:
+        file (str | FieldFile): name of the image in the storage, or its `FieldFile`
+        width (int): width to downsize to
+        height (int): height to downsize to
+        storage (Storage | None, optional): storage of the image.
+            Defaults to None (storage of the `FieldFile`).
+        resample (Image.Resampling, optional): resampling filter.
+            Defaults to DEFAULT_RESAMPLE.
+        reducing_gap (float | None, optional): see `downsize_and_save_image_from_path`.
+            Defaults to DEFAULT_REDUCING_GAP.
+
+    Returns:
+        bool: whether the image was resized
+
+    Usage:
+        >>> downsize_and_save_image_from_storage(user.avatar, 512, 512)
+    """
+    name, storage = _get_storage_file(file, storage)
+    with _open_from_storage(name, storage) as f:
+        img, (original_width, original_height) = _open_image(f)
+        if (original_height <= height) and (original_width <= width):
+            return False
+        format = img.format
+        if _is_animated(img, format):
+            frames = downsize_frames(img, width, height, resample, reducing_gap)
+            saved_name = _save_image(next(frames), format, name, storage, frames)
+        else:
+            img.thumbnail((width, height), resample=resample, reducing_gap=reducing_gap)
+            saved_name = _save_image(img, format, name, storage)
+    if isinstance(file, FieldFile):
+        file.name = saved_name
+    return True
+
+
+def image_to_base64_from_storage(
+    file: str | FieldFile,
+    downsize_to: int | None = None,
+    storage: Storage | None = None,
+    resample: Image.Resampling = DEFAULT_RESAMPLE,
+    reducing_gap: float | None = DEFAULT_REDUCING_GAP,
+    **options: Any,
+) -> bytes:
+    """
+    Same as `image_to_base64`, but for a file in a Django storage.
+    The image is read through a bounded buffer.
+
+    Args:
+        file (str | FieldFile): name of the image in the storage, or its `FieldFile`
+        downsize_to (int | None): max size to resize to
+        storage (Storage | None, optional): storage of the image.
+            Defaults to None (storage of the `FieldFile`).
+        resample (Image.Resampling, optional): resampling filter used when downsizing.
+            Defaults to DEFAULT_RESAMPLE.
+        reducing_gap (float | None, optional): see `downsize_image`.
+            Defaults to DEFAULT_REDUCING_GAP.
+        **options: encoding options of `image_to_base64` (format, quality, etc.)
+
+    Returns:
+        bytes: base64 representation of the image
+    """
+    name, storage = _get_storage_file(file, storage)
+    with _open_from_storage(name, storage) as f:
+        return image_to_base64(f, downsize_to, resample, reducing_gap, **options)
+
+
+def generate_renditions(
+    source: str | IO[bytes],
+    name: str,
+    sizes: dict[str, int],
+    storage: Storage,
+    upload_to: str | None = None,
+    resample: Image.Resampling = DEFAULT_RESAMPLE,
+    reducing_gap: float | None = DEFAULT_REDUCING_GAP,
+) -> dict[str, Rendition]:
+    """
+    Generates several downsized copies of an image and saves them in a storage.
+    The image is decoded only once: each rendition is downsized from the previous one,
+    from the largest to the smallest.
+    Renditions are named after the image (see `get_rendition_name`),
+    and existing renditions with the same name are replaced.
+
+    Args:
+        source (str | IO[bytes]): path or file object of the image
+        name (str): name of the image, used to name the renditions
+        sizes (dict[str, int]): max size of each rendition, per label
+        storage (Storage): storage to save the renditions in
+        upload_to (str | None, optional): directory of the renditions.
+            Defaults to None (directory of `name`).
+        resample (Image.Resampling, optional): resampling filter.
+            Defaults to DEFAULT_RESAMPLE.
+        reducing_gap (float | None, optional): see `downsize_image`.
+            Defaults to DEFAULT_REDUCING_GAP.
+
+    Returns:
+        dict[str, Rendition]: renditions per label, from the largest to the smallest
+
+    Usage:
+        >>> renditions = generate_renditions(
+        ...     user.avatar.path,
+        ...     user.avatar.name,
+        ...     {"full": 1920, "card": 640, "thumb": 128},
+        ...     user.avatar.storage,
+        ... )
+        >>> renditions["thumb"].name
+        'avatars/john_thumb.png'
+    """
+    renditions = {}
+    with open_image(source) as original:
+        format = original.format
+        if sizes:
+            _draft_image(original, max(sizes.values()), reducing_gap)
+        image = original
+        for label, max_size in sorted(sizes.items(), key=lambda item: -item[1]):
+            _, image = downsize_image(image, max_size, resample, reducing_gap)
+            rendition_name = _save_image(
+                image, format, get_rendition_name(name, label, upload_to), storage
+            )
+            renditions[label] = Rendition(
+                label, rendition_name, image.width, image.height
+            )
+    return renditions
+
+
+def get_rendition_name(name: str, label: str, upload_to: str | None = None) -> str:
+    """
+    Builds the deterministic name of an image rendition: `<upload_to>/<stem>_<label><ext>`.
+
+    Args:
+        name (str): name of the image
+        label (str): label of the rendition
+        upload_to (str | None, optional): directory of the rendition.
+            Defaults to None (directory of `name`).
+
+    Returns:
+        str: the name of the rendition
+    """
+    directory, filename = os.path.split(name)
+    stem, extension = os.path.splitext(filename)
+    if upload_to is None:
+        upload_to = directory
+    return os.path.join(upload_to, f"{stem}_{label}{extension}")
+
+
+def downsize_and_save_images(
+    paths: Iterable[str],
+    width: int,
+    height: int,
+    storage: Storage | None = None,
+    max_workers: int | None = None,
+    executor: Executor | None = None,
+    resample: Image.Resampling = DEFAULT_RESAMPLE,
+    reducing_gap: float | None = DEFAULT_REDUCING_GAP,
+) -> Iterator[ImageBatchResult]:
+    """
+    Downsizes and saves many images in parallel, using a `ProcessPoolExecutor`.
+    Paths are consumed lazily and results are yielded as soon as each image is done,
+    so huge batches can be processed with bounded memory.
+    Errors do not stop the batch and are reported in the results instead.
+
+    Args:
+        paths (Iterable[str]): local file paths, or file names if `storage` is provided
+        width (int): width to downsize to
+        height (int): height to downsize to
+        storage (Storage | None, optional): storage to read and write the images with.
+            Must be picklable when using a process pool. Defaults to None.
+        max_workers (int | None, optional): number of processes of the pool,
+            also used to limit the number of pending images. Defaults to None (number of CPUs).
+        executor (Executor | None, optional): executor to use instead of
+            creating a process pool. It is not shut down. Defaults to None.
+        resample (Image.Resampling, optional): resampling filter.
+            Defaults to DEFAULT_RESAMPLE.
+        reducing_gap (float | None, optional): see `downsize_image`.
+            Defaults to DEFAULT_REDUCING_GAP.
+
+    Yields:
+        ImageBatchResult: the result of each image, in completion order
+
+    Usage:
+        >>> for result in downsize_and_save_images(paths, 1920, 1080, max_workers=8):
+        ...     if result.error:
+        ...         logger.warning("%s: %s", result.path, result.error)
+    """
+    pool = executor or ProcessPoolExecutor(max_workers=max_workers)
+    max_pending = (max_workers or os.cpu_count() or 1) * BATCH_MAX_PENDING_PER_WORKER
+    pending: dict[Future, str] = {}
+    try:
+        for path in paths:
+            future = pool.submit(
+                _downsize_and_save_image,
+                path,
+                width,
+                height,
+                storage,
+                resample,
+                reducing_gap,
+            )
+            pending[future] = path
+            if len(pending) >= max_pending:
+                yield from _pop_batch_results(pending)
+        while pending:
+            yield from _pop_batch_results(pending)
+    finally:
+        if executor is None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _downsize_and_save_image(
+    path: str,
+    width: int,
+    height: int,
+    storage: Storage | None,
+    resample: Image.Resampling,
+    reducing_gap: float | None,
+) -> ImageBatchResult:
+    """Worker of `downsize_and_save_images` that never raises."""
+    try:
+        if storage is None:
+            resized = downsize_and_save_image_from_path(
+                path, width, height, resample, reducing_gap
+            )
+        else:
+            resized = downsize_and_save_image_from_storage(
+                path, width, height, storage, resample, reducing_gap
+            )
+        return ImageBatchResult(path, resized, None)
+    except Exception as e:  # noqa: BLE001
+        return ImageBatchResult(path, False, f"{e.__class__.__name__}: {e}")
+
+
+def _get_file_size(file_path: str | IO[bytes]) -> int:
+    """Returns the size of a file from its path or file object, without reading it."""
+    if isinstance(file_path, str):
+        return os.path.getsize(file_path)
+    size = getattr(file_path, "size", None)
+    if size is not None:
+        return size
+    position = file_path.tell()
+    size = file_path.seek(0, os.SEEK_END)
+    file_path.seek(position)
+    return size
+
+
+def _file_to_base64(file_path: str | IO[bytes]) -> bytes:
+    """
+    Encodes the raw content of a file in base64, chunk by chunk.
+    Large local files are memory-mapped instead of being read in memory.
+    """
+    if not isinstance(file_path, str):
+        file_path.seek(0)
+        return _chunks_to_base64(iter(lambda: file_path.read(BASE64_CHUNK_SIZE), b""))
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < BASE64_MMAP_MIN_SIZE:
+            return base64.b64encode(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _chunks_to_base64(
+                mapped[i : i + BASE64_CHUNK_SIZE]
+                for i in range(0, len(mapped), BASE64_CHUNK_SIZE)
+            )
+
+
+def _chunks_to_base64(chunks: Iterable[bytes]) -> bytes:
+    """Encodes chunks of bytes in base64, carrying over bytes that do not fill a group of 3."""
+    encoded = []
+    rest = b""
+    for chunk in chunks:
+        data = rest + chunk
+        cut = len(data) - len(data) % 3
+        encoded.append(base64.b64encode(data[:cut]))
+        rest = data[cut:]
+    encoded.append(base64.b64encode(rest))
+    return b"".join(encoded)
+
+
+def _get_storage_file(
+    file: str | FieldFile, storage: Storage | None
+) -> tuple[str, Storage]:
+    """Returns the name and storage of a file given by name or as a `FieldFile`."""
+    if isinstance(file, FieldFile):
+        return file.name or "", storage or file.storage
+    if storage is None:
+        raise ValueError("A storage is required when the file is given by name")
+    return file, storage
+
+
+@contextmanager
+def _open_from_storage(name: str, storage: Storage) -> Generator[IO[bytes], None, None]:
+    """
+    Opens a file from a storage, reading it through a bounded buffer
+    if it supports `readinto` (remote storage files often do not).
+    """
+    with storage.open(name, "rb") as f:
+        if getattr(f, "readinto", None) is None:
+            yield f
+        else:
+            yield BufferedReader(f, STORAGE_READ_BUFFER_SIZE)
+
+
+def _save_image(
+    image: Image.Image,
+    format: str | None,
+    name: str,
+    storage: Storage,
+    append_images: Iterable[Image.Image] | None = None,
+) -> str:
+    """
+    Saves an image in a storage, replacing any existing file with the same name.
+    The encoded image is buffered in memory up to `STORAGE_SPOOL_MAX_SIZE`, then on disk,
+    and uploaded once. If the storage does not overwrite files, the existing file
+    is copied the same way before being deleted, and restored if the upload fails.
+    """
+    with SpooledTemporaryFile(max_size=STORAGE_SPOOL_MAX_SIZE) as buffered:
+        encode_image(image, buffered, format, append_images=append_images)
+        buffered.seek(0)
+        # New file, or storage that overwrites files
+        if storage.get_available_name(name) == name:
+            return storage.save(name, File(buffered))
+        with SpooledTemporaryFile(max_size=STORAGE_SPOOL_MAX_SIZE) as original:
+            with storage.open(name, "rb") as f:
+                for chunk in f.chunks():
+                    original.write(chunk)
+            storage.delete(name)
+            try:
+                return storage.save(name, File(buffered))
+            except Exception:
+                original.seek(0)
+                storage.save(name, File(original))
+                raise
+
+
+def _draft_image(img: Image.Image, max_size: int, reducing_gap: float | None) -> None:
+    """
+    Configures a JPEG image that is not loaded yet to be decoded at a reduced scale,
+    still `reducing_gap` times larger than `max_size`. Only for images owned by the caller.
+    """
+    if reducing_gap is None or max(img.size) <= max_size:
+        return
+    ratio = max_size * reducing_gap / max(img.size)
+    img.draft(None, (int(img.width * ratio), int(img.height * ratio)))
+
+
+def _is_animated(img: Image.Image, format: str | None) -> bool:
+    """Checks if an image has several frames that can be saved in the given format."""
+    return getattr(img, "is_animated", False) and format in ANIMATED_FORMATS
+
+
+def _iter_downsized_frames(
+    img: Image.Image,
+    size: tuple[int, int],
+    resample: Image.Resampling,
+    reducing_gap: float | None,
+) -> Iterator[Image.Image]:
+    """Yields each frame of an image, resized to the given size."""
+    for frame in ImageSequence.Iterator(img):
+        if frame.mode in ("1", "P"):
+            # Palette images can only be resized with `NEAREST`
+            frame = frame.convert("RGBA")
+        yield frame.resize(size, resample=resample, reducing_gap=reducing_gap)
+
+
+def _pop_batch_results(pending: dict[Future, str]) -> Iterator[ImageBatchResult]:
+    """Waits for at least one pending image and yields the finished ones."""
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        path = pending.pop(future)
+        try:
+            yield future.result()
+        except Exception as e:  # noqa: BLE001 (e.g. a worker process died)
+            yield ImageBatchResult(path, False, f"{e.__class__.__name__}: {e}")
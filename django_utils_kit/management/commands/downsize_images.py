@@ -0,0 +1,78 @@
+"""Management command to downsize many images in parallel."""
+
+from collections.abc import Iterator
+import sys
+from typing import Any
+
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandParser
+
+from django_utils_kit.images import downsize_and_save_images
+
+
+class Command(BaseCommand):
+    help = "Downsizes images to the given dimensions, using a pool of processes."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "paths", nargs="*", help="Paths (or storage names) of the images"
+        )
+        parser.add_argument(
+            "--from-file",
+            help="File listing one path per line, or '-' to read from stdin",
+        )
+        parser.add_argument("--width", type=int, required=True)
+        parser.add_argument("--height", type=int, required=True)
+        parser.add_argument(
+            "--storage",
+            help="Alias of the storage to use (from `settings.STORAGES`) instead of local paths",
+        )
+        parser.add_argument(
+            "--workers", type=int, help="Number of processes (defaults to CPU count)"
+        )
+        parser.add_argument(
+            "--progress-every",
+            type=int,
+            default=100,
+            help="Reports the progress every N images",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        storage = storages[options["storage"]] if options["storage"] else None
+        progress_every = options["progress_every"]
+        results = downsize_and_save_images(
+            self._iter_paths(options["paths"], options["from_file"]),
+            options["width"],
+            options["height"],
+            storage=storage,
+            max_workers=options["workers"],
+        )
+        count, resized, errors = 0, 0, 0
+        for result in results:
+            count += 1
+            if result.error:
+                errors += 1
+                self.stderr.write(f"{result.path}: {result.error}")
+            elif result.resized:
+                resized += 1
+                if options["verbosity"] >= 2:
+                    self.stdout.write(f"Resized {result.path}")
+            if count % progress_every == 0:
+                self.stdout.write(self._summary(count, resized, errors))
+        self.stdout.write(self.style.SUCCESS(self._summary(count, resized, errors)))
+
+    @staticmethod
+    def _iter_paths(paths: list[str], from_file: str | None) -> Iterator[str]:
+        """Yields the paths from the arguments, then from the file, lazily."""
+        yield from paths
+        if from_file is None:
+            return
+        if from_file == "-":
+            yield from (line.strip() for line in sys.stdin if line.strip())
+            return
+        with open(from_file) as f:
+            yield from (line.strip() for line in f if line.strip())
+
+    @staticmethod
+    def _summary(count: int, resized: int, errors: int) -> str:
+        return f"Processed {count} images ({resized} resized, {errors} errors)"
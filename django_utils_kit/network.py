@@ -35,3 +35,37 @@ def get_server_domain(default: str = "http://127.0.0.1:8000/") -> str:
     hosts = settings.ALLOWED_HOSTS
     domain = hosts[0] if hosts else default
     return domain
+
+
+def get_accepted_media_types(request: HttpRequest) -> list[str]:
+    """
+    Gets the media types explicitly accepted by the client, from the `Accept` header.
+    Media types are sorted by their quality value, and refused ones (`q=0`) are ignored.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        list[str]: The accepted media types, in order of preference.
+
+    Usage:
+        >>> get_accepted_media_types(request)  # Accept: image/avif,image/webp;q=0.9
+        ['image/avif', 'image/webp']
+    """
+    media_types = []
+    for value in request.META.get("HTTP_ACCEPT", "").split(","):
+        media_type, *params = (part.strip() for part in value.split(";"))
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, param_value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(param_value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            media_types.append((quality, media_type.lower()))
+    media_types.sort(key=lambda item: -item[0])
+    return [media_type for _, media_type in media_types]
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class OutboxConfig(AppConfig):
+    name = "django_utils_kit.outbox"
+    label = "django_utils_kit_outbox"
+    verbose_name = "Email outbox"
+    default_auto_field = "django.db.models.BigAutoField"
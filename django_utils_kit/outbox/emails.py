@@ -0,0 +1,215 @@
+"""Utilities to queue emails in the outbox and send them in batches."""
+
+from collections import defaultdict
+from datetime import timedelta
+from time import monotonic, perf_counter, sleep
+from typing import NamedTuple
+import uuid
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from django_utils_kit.outbox.models import OutboxEmail
+
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_BACKOFF_BASE = 60
+OUTBOX_BACKOFF_MAX = 6 * 60 * 60
+OUTBOX_LEASE = 10 * 60
+
+
+class OutboxBatchResult(NamedTuple):
+    """Outcome of `send_outbox_emails`."""
+
+    sent: int
+    retried: int
+    failed: int
+    duration: float
+
+    @property
+    def processed(self) -> int:
+        """Number of emails taken from the outbox."""
+        return self.sent + self.retried + self.failed
+
+
+def enqueue_email(
+    message: EmailMessage,
+    idempotency_key: str | None = None,
+    backend: str | None = None,
+) -> OutboxEmail:
+    """
+    Saves an email in the outbox, to be sent by the `send_outbox_emails` command.
+    An email already queued with the same idempotency key is returned instead.
+
+    Args:
+        message (EmailMessage): the email to send, without attachments
+        idempotency_key (str | None, optional): unique key of the email.
+            Defaults to None (random key).
+        backend (str | None, optional): dotted path of the email backend.
+            Defaults to None (`settings.EMAIL_BACKEND`).
+
+    Returns:
+        OutboxEmail: the queued email
+    """
+    email, _ = OutboxEmail.objects.get_or_create(
+        idempotency_key=idempotency_key or uuid.uuid4().hex,
+        defaults={
+            "backend": backend or "",
+            "subject": message.subject,
+            "body": message.body,
+            "content_subtype": message.content_subtype,
+            "from_email": message.from_email,
+            "to": message.to,
+            "cc": message.cc,
+            "bcc": message.bcc,
+        },
+    )
+    return email
+
+
+def get_retry_delay(
+    attempts: int,
+    backoff_base: float = OUTBOX_BACKOFF_BASE,
+    backoff_max: float = OUTBOX_BACKOFF_MAX,
+) -> float:
+    """
+    Returns the exponential delay before retrying an email.
+
+    Args:
+        attempts (int): number of failed attempts
+        backoff_base (float, optional): delay after the first failure, in seconds.
+            Defaults to OUTBOX_BACKOFF_BASE.
+        backoff_max (float, optional): max delay, in seconds. Defaults to OUTBOX_BACKOFF_MAX.
+
+    Returns:
+        float: the delay in seconds
+    """
+    return min(backoff_max, backoff_base * 2 ** max(attempts - 1, 0))
+
+
+def send_outbox_emails(
+    batch_size: int = OUTBOX_BATCH_SIZE,
+    max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+    backoff_base: float = OUTBOX_BACKOFF_BASE,
+    backoff_max: float = OUTBOX_BACKOFF_MAX,
+    rate_limits: dict[str, float] | None = None,
+) -> OutboxBatchResult:
+    """
+    Sends a batch of due emails from the outbox, with one connection per backend.
+    Emails are leased for `OUTBOX_LEASE` seconds so that concurrent workers skip them,
+    and those of a crashed worker are retried once the lease expires.
+    The lease of the remaining emails is renewed while the batch is being sent,
+    as rate limits or slow backends can make it outlast the lease.
+    Failed emails are retried with an exponential backoff, up to `max_attempts` times.
+
+    Args:
+        batch_size (int, optional): max number of emails to send.
+            Defaults to OUTBOX_BATCH_SIZE.
+        max_attempts (int, optional): attempts before an email is marked as failed.
+            Defaults to OUTBOX_MAX_ATTEMPTS.
+        backoff_base (float, optional): delay after the first failure, in seconds.
+            Defaults to OUTBOX_BACKOFF_BASE.
+        backoff_max (float, optional): max delay between attempts, in seconds.
+            Defaults to OUTBOX_BACKOFF_MAX.
+        rate_limits (dict[str, float] | None, optional): max emails per second by backend path.
+            Defaults to `settings.EMAIL_OUTBOX_RATE_LIMITS`.
+
+    Returns:
+        OutboxBatchResult: the number of sent, retried, and failed emails, and the duration.
+
+    Usage:
+        >>> result = send_outbox_emails(rate_limits={"myapp.backends.SESBackend": 14})
+        >>> print(f"{result.sent}/{result.processed} sent")
+    """
+    if rate_limits is None:
+        rate_limits = getattr(settings, "EMAIL_OUTBOX_RATE_LIMITS", {})
+    start = perf_counter()
+    emails_by_backend: dict[str, list[OutboxEmail]] = defaultdict(list)
+    emails = _claim_emails(batch_size)
+    leased_until = monotonic() + OUTBOX_LEASE
+    unsent = {email.pk for email in emails}
+    for email in emails:
+        emails_by_backend[email.backend or settings.EMAIL_BACKEND].append(email)  # ty: ignore
+    sent, retried, failed = 0, 0, 0
+    for backend, emails in emails_by_backend.items():
+        interval = 1 / rate_limits[backend] if rate_limits.get(backend) else 0
+        connection = get_connection(backend)
+        last_sent_at = None
+        # Connects before the first email, and after each failure
+        reconnect = True
+        try:
+            for email in emails:
+                # Renewed halfway, before other workers can claim the remaining emails
+                if leased_until - monotonic() < OUTBOX_LEASE / 2:
+                    _renew_lease(unsent)
+                    leased_until = monotonic() + OUTBOX_LEASE
+                unsent.discard(email.pk)
+                try:
+                    if last_sent_at is not None and interval:
+                        sleep(max(0.0, last_sent_at + interval - monotonic()))
+                    last_sent_at = monotonic()
+                    if reconnect:
+                        connection.close()
+                        connection.open()
+                        reconnect = False
+                    connection.send_messages([email.to_message(connection)])
+                except Exception as e:  # noqa: BLE001
+                    reconnect = True
+                    if _record_failure(
+                        email, e, max_attempts, backoff_base, backoff_max
+                    ):
+                        retried += 1
+                    else:
+                        failed += 1
+                    continue
+                email.status = OutboxEmail.Status.SENT  # ty: ignore
+                email.sent_at = timezone.now()
+                email.save(update_fields=["status", "sent_at"])
+                sent += 1
+        finally:
+            connection.close()
+    return OutboxBatchResult(sent, retried, failed, perf_counter() - start)
+
+
+def _claim_emails(batch_size: int) -> list[OutboxEmail]:
+    """Leases the next due emails, skipping those locked by other workers."""
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.Status.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "pk")[:batch_size]
+        )
+        OutboxEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            next_attempt_at=now + timedelta(seconds=OUTBOX_LEASE)
+        )
+    return emails
+
+
+def _renew_lease(pks: set[int]) -> None:
+    """Extends the lease of the claimed emails that are not sent yet."""
+    OutboxEmail.objects.filter(pk__in=pks).update(
+        next_attempt_at=timezone.now() + timedelta(seconds=OUTBOX_LEASE)
+    )
+
+
+def _record_failure(
+    email: OutboxEmail,
+    error: Exception,
+    max_attempts: int,
+    backoff_base: float,
+    backoff_max: float,
+) -> bool:
+    """Schedules the next attempt of an email, and returns whether it will be retried."""
+    email.attempts += 1  # ty: ignore
+    email.last_error = f"{type(error).__name__}: {error}"  # ty: ignore
+    retry = email.attempts < max_attempts
+    if retry:
+        delay = get_retry_delay(email.attempts, backoff_base, backoff_max)
+        email.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    else:
+        email.status = OutboxEmail.Status.FAILED  # ty: ignore
+    email.save(update_fields=["attempts", "last_error", "next_attempt_at", "status"])
+    return retry
@@ -0,0 +1,61 @@
+"""Management command to send the emails of the outbox."""
+
+from time import sleep
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from django_utils_kit.outbox.emails import (
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_MAX_ATTEMPTS,
+    send_outbox_emails,
+)
+
+
+class Command(BaseCommand):
+    help = "Sends the emails of the outbox in batches, until interrupted."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=OUTBOX_BATCH_SIZE,
+            help="Max number of emails sent per batch",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=OUTBOX_MAX_ATTEMPTS,
+            help="Attempts before an email is marked as failed",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait when the outbox is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Sends the due emails, then exits",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        batch_size = options["batch_size"]
+        try:
+            while True:
+                result = send_outbox_emails(
+                    batch_size=batch_size, max_attempts=options["max_attempts"]
+                )
+                if result.processed:
+                    self.stdout.write(
+                        f"Sent {result.sent} emails ({result.retried} retried, "
+                        f"{result.failed} failed) in {result.duration:.2f}s"
+                    )
+                if result.processed < batch_size:
+                    if options["once"]:
+                        break
+                    sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS("Outbox worker stopped"))
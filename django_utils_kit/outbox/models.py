@@ -0,0 +1,70 @@
+"""Models of the email outbox."""
+
+import hashlib
+
+from django.core.mail import EmailMessage
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.utils import DNS_NAME
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxEmail(models.Model):
+    """Rendered email waiting to be sent by the `send_outbox_emails` command."""
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        SENT = "sent", "Sent"
+        FAILED = "failed", "Failed"
+
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    backend = models.CharField(max_length=255, blank=True, default="")
+    subject = models.TextField()
+    body = models.TextField()
+    content_subtype = models.CharField(max_length=20, default="plain")
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list, blank=True)
+    cc = models.JSONField(default=list, blank=True)
+    bcc = models.JSONField(default=list, blank=True)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_due_idx")
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.subject} ({self.status})"
+
+    def to_message(self, connection: BaseEmailBackend | None = None) -> EmailMessage:
+        """
+        Rebuilds the email, with a `Message-ID` derived from the idempotency key
+        so that retried emails can be deduplicated.
+
+        Args:
+            connection (BaseEmailBackend | None, optional): connection to send it with.
+                Defaults to None.
+
+        Returns:
+            EmailMessage: the email to send
+        """
+        digest = hashlib.sha256(self.idempotency_key.encode()).hexdigest()[:32]
+        message = EmailMessage(
+            subject=self.subject,
+            body=self.body,
+            from_email=self.from_email,
+            to=self.to,
+            cc=self.cc,
+            bcc=self.bcc,
+            connection=connection,
+            headers={"Message-ID": f"<{digest}@{DNS_NAME}>"},
+        )
+        message.content_subtype = self.content_subtype  # ty: ignore
+        return message
@@ -1,12 +1,30 @@
 """Additional serializers and fields for DRF."""
 
+from datetime import datetime
+import hashlib
 from typing import Any
 
-from django.conf import settings
+from django.conf import DEFAULT_STORAGE_ALIAS, settings
+from django.core import signing
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.files import File
+from django.core.files.storage import Storage, default_storage, storages
 from django.db.models import Model
+from django.urls import reverse
 from rest_framework import serializers
 
-from django_utils_kit.images import image_to_base64
+from django_utils_kit.images import (
+    ImageTooLargeError,
+    get_image_mime_type,
+    image_to_base64,
+    image_to_base64_from_storage,
+    is_format_supported,
+    open_image,
+)
+from django_utils_kit.network import get_accepted_media_types
+
+THUMBNAIL_SIGNING_SALT = "django_utils_kit.thumbnail"
 
 
 class ReadOnlyModelSerializer(serializers.ModelSerializer):
@@ -20,7 +38,250 @@ class ReadOnlyModelSerializer(serializers.ModelSerializer):
 
 
 class ThumbnailField(serializers.ImageField):
-    """`ImageField` with a representation that returns a base64 downsized image."""
+    """
+    `ImageField` with a representation that returns a base64 downsized image.
+    If `settings.THUMBNAIL_CACHE_ALIAS` is set, thumbnails of stored files are cached
+    in that Django cache (for `settings.THUMBNAIL_CACHE_TIMEOUT` seconds)
+    and regenerated when the file size or modified time changes.
+    If `formats` are provided (or `settings.THUMBNAIL_FORMATS`), the first one
+    explicitly accepted by the request's `Accept` header is used, without metadata.
+    If `as_url` is enabled (or `settings.THUMBNAIL_AS_URL`), stored files are represented
+    by a signed URL to a `ThumbnailView`, unless they are smaller than `inline_max_bytes`
+    or their storage is not one of `settings.STORAGES`.
+    Uploaded images exceeding the image budget (see `images.open_image`) are rejected.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        formats: list[str] | None = None,
+        quality: int | None = None,
+        as_url: bool | None = None,
+        inline_max_bytes: int | None = None,
+        url_name: str | None = None,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Args:
+            formats (list[str] | None, optional): output formats by order of preference,
+                like `["AVIF", "WEBP"]`. Defaults to `settings.THUMBNAIL_FORMATS`.
+            quality (int | None, optional): encoder quality.
+                Defaults to `settings.THUMBNAIL_QUALITY`.
+            as_url (bool | None, optional): returns a URL instead of the base64 image.
+                Defaults to `settings.THUMBNAIL_AS_URL`.
+            inline_max_bytes (int | None, optional): in URL mode, files up to this size
+                are still inlined. Defaults to `settings.THUMBNAIL_INLINE_MAX_BYTES`.
+            url_name (str | None, optional): URL name of the `ThumbnailView`.
+                Defaults to `settings.THUMBNAIL_URL_NAME` or "thumbnail".
+        """
+        self.formats = formats
+        self.quality = quality
+        self.as_url = as_url
+        self.inline_max_bytes = inline_max_bytes
+        self.url_name = url_name
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data: Any) -> Any:
+        """Rejects images that exceed the budget of `open_image`."""
+        file_object = super().to_internal_value(data)
+        try:
+            open_image(file_object)
+        except ImageTooLargeError as e:
+            raise serializers.ValidationError(str(e), code="image_too_large")
+        finally:
+            file_object.seek(0)
+        return file_object
+
+    def to_representation(self, data: File) -> bytes | str:
+        max_size = settings.MAX_THUMBNAIL_SIZE
+        format = self._get_format()
+        quality = self._get_option("quality", "THUMBNAIL_QUALITY", None)
+        storage = getattr(data, "storage", None)
+        if storage is None or not data.name:
+            return _make_thumbnail(data, max_size, format, quality)
+        if self._get_option("as_url", "THUMBNAIL_AS_URL", False):
+            inline_max_bytes = self._get_option(
+                "inline_max_bytes", "THUMBNAIL_INLINE_MAX_BYTES", None
+            )
+            # The view can only find the file in a configured storage
+            alias = _get_storage_alias(storage)
+            if alias is not None and (
+                inline_max_bytes is None or data.size > inline_max_bytes
+            ):
+                return self._get_url(data.name, alias, max_size, format, quality)
+        return get_thumbnail(data.name, storage, max_size, format, quality)
+
+    def _get_option(self, attribute: str, setting: str, default: Any) -> Any:
+        """Returns the field option, or the setting if it was not provided."""
+        value = getattr(self, attribute)
+        if value is None:
+            value = getattr(settings, setting, default)
+        return value
+
+    def _get_format(self) -> str | None:
+        """Returns the preferred format accepted by the request, if any."""
+        formats = self._get_option("formats", "THUMBNAIL_FORMATS", [])
+        request = self.context.get("request")
+        if not formats or request is None:
+            return None
+        accepted_media_types = get_accepted_media_types(request)
+        for format in formats:
+            if not is_format_supported(format):
+                continue
+            if get_image_mime_type(format) in accepted_media_types:
+                return format.upper()
+        return None
+
+    def _get_url(
+        self,
+        name: str,
+        alias: str,
+        max_size: int,
+        format: str | None,
+        quality: int | None,
+    ) -> str:
+        """Returns the URL of the thumbnail, which changes with the file."""
+        url_name = self._get_option("url_name", "THUMBNAIL_URL_NAME", "thumbnail")
+        version = _get_file_version(name, storages[alias])
+        token = signing.dumps(
+            [alias, name, max_size, format, quality, _hash_version(version)],
+            salt=THUMBNAIL_SIGNING_SALT,
+        )
+        url = reverse(url_name, kwargs={"token": token})
+        request = self.context.get("request")
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        return url
+
+
+def get_thumbnail(
+    name: str,
+    storage: Storage,
+    max_size: int,
+    format: str | None = None,
+    quality: int | None = None,
+) -> bytes:
+    """
+    Gets the base64 thumbnail of a stored image, as `ThumbnailField` would.
+    If `settings.THUMBNAIL_CACHE_ALIAS` is set, it is cached until the file changes.
+
+    Args:
+        name (str): name of the file in its storage
+        storage (Storage): storage of the file
+        max_size (int): max size of the thumbnail
+        format (str | None, optional): output format of the thumbnail.
+            Defaults to None (format of the image).
+        quality (int | None, optional): encoder quality. Defaults to None.
+
+    Returns:
+        bytes: base64 representation of the thumbnail
+    """
+    alias = getattr(settings, "THUMBNAIL_CACHE_ALIAS", None)
+    if alias is None:
+        return _make_thumbnail(name, max_size, format, quality, storage)
+    cache = caches[alias]
+    key = get_thumbnail_cache_key(name, max_size, format)
+    version = (*_get_file_version(name, storage), quality)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    thumbnail = _make_thumbnail(name, max_size, format, quality, storage)
+    timeout = getattr(settings, "THUMBNAIL_CACHE_TIMEOUT", DEFAULT_TIMEOUT)
+    cache.set(key, (version, thumbnail), timeout)
+    return thumbnail
+
+
+def get_thumbnail_cache_key(name: str, max_size: int, format: str | None = None) -> str:
+    """
+    Builds the cache key of a `ThumbnailField` thumbnail.
+
+    Args:
+        name (str): name of the file in its storage
+        max_size (int): max size of the thumbnail
+        format (str | None, optional): output format of the thumbnail.
+            Defaults to None (format of the image).
+
+    Returns:
+        str: the cache key
+    """
+    digest = hashlib.sha256(f"{name}:{max_size}:{format or ''}".encode()).hexdigest()
+    return f"django_utils_kit:thumbnail:{digest}"
+
+
+def invalidate_thumbnail(
+    name: str, max_size: int | None = None, formats: list[str] | None = None
+) -> None:
+    """
+    Removes the cached `ThumbnailField` thumbnails of a file, in its own format
+    and in each of the given formats.
+    Should be called when an image field changes or its file is deleted.
+
+    Args:
+        name (str): name of the file in its storage
+        max_size (int | None, optional): max size of the thumbnail.
+            Defaults to `settings.MAX_THUMBNAIL_SIZE`.
+        formats (list[str] | None, optional): output formats of the field, if set.
+            Defaults to `settings.THUMBNAIL_FORMATS`.
+
+    Usage:
+        >>> invalidate_thumbnail(user.avatar.name, formats=["WEBP", "JPEG"])
+    """
+    alias = getattr(settings, "THUMBNAIL_CACHE_ALIAS", None)
+    if alias is None or not name:
+        return
+    if max_size is None:
+        max_size = settings.MAX_THUMBNAIL_SIZE
+    if formats is None:
+        formats = getattr(settings, "THUMBNAIL_FORMATS", [])
+    keys = [get_thumbnail_cache_key(name, max_size)] + [
+        get_thumbnail_cache_key(name, max_size, format.upper()) for format in formats
+    ]
+    caches[alias].delete_many(keys)
+
+
+def _get_storage_alias(storage: Storage) -> str | None:
+    """Returns the alias of a storage in `settings.STORAGES`, if it is one of them."""
+    if storage is default_storage:
+        return DEFAULT_STORAGE_ALIAS
+    # The storage of a file is already loaded, so the others are not instantiated
+    for alias, loaded_storage in storages._storages.items():
+        if storage is loaded_storage:
+            return alias
+    return None
+
+
+def _hash_version(version: tuple[Any, ...]) -> str:
+    """Returns a short and stable hash of a file version."""
+    return hashlib.sha256(repr(version).encode()).hexdigest()[:16]
+
+
+def _get_file_version(name: str, storage: Storage) -> tuple[int, datetime | None]:
+    """Returns the size and modified time of a stored file, which change with its content."""
+    try:
+        modified_time = storage.get_modified_time(name)
+    except NotImplementedError:
+        modified_time = None
+    return storage.size(name), modified_time
+
 
-    def to_representation(self, data: serializers.ImageField) -> bytes:
-        return image_to_base64(data, settings.MAX_THUMBNAIL_SIZE)  # ty: ignore
+def _make_thumbnail(
+    file: Any,
+    max_size: int,
+    format: str | None,
+    quality: int | None,
+    storage: Storage | None = None,
+) -> bytes:
+    """Generates the base64 thumbnail of an image file, or of a stored image name."""
+    strip_metadata = format is not None
+    if storage is not None:
+        return image_to_base64_from_storage(
+            file,
+            max_size,
+            storage,
+            format=format,
+            quality=quality,
+            strip_metadata=strip_metadata,
+        )
+    return image_to_base64(
+        file, max_size, format=format, quality=quality, strip_metadata=strip_metadata
+    )
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Any, ClassVar
+
+from django.core.mail.backends.locmem import EmailBackend
+
+from django_utils_kit.emails import BaseAsyncEmailBackend
+
+MEMORY_ASYNC_BACKEND = "django_utils_kit.tests.fake_app.emails.MemoryAsyncEmailBackend"
+FAILING_BACKEND = "django_utils_kit.tests.fake_app.emails.FailingEmailBackend"
+
+
+class MemoryAsyncEmailBackend(BaseAsyncEmailBackend):
+    """Keeps the messages in memory, and fails for the "fail" recipient."""
+
+    messages: ClassVar[list[Any]] = []
+    connections = 0
+    closes = 0
+    in_flight = 0
+    max_in_flight = 0
+    open_error: Exception | None = None
+
+    @classmethod
+    def reset(cls) -> None:
+        cls.messages = []
+        cls.connections = 0
+        cls.closes = 0
+        cls.in_flight = 0
+        cls.max_in_flight = 0
+        cls.open_error = None
+
+    async def open(self) -> None:
+        if self.open_error is not None:
+            raise self.open_error
+        MemoryAsyncEmailBackend.connections += 1
+
+    async def close(self) -> None:
+        MemoryAsyncEmailBackend.closes += 1
+
+    async def send_messages(self, messages: list[Any]) -> int:
+        cls = MemoryAsyncEmailBackend
+        cls.in_flight += 1
+        cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        await asyncio.sleep(0.01)
+        cls.in_flight -= 1
+        if any("fail" in message.to for message in messages):
+            raise ConnectionError("Connection lost")
+        cls.messages.extend(messages)
+        return len(messages)
+
+
+class FailingEmailBackend(EmailBackend):
+    """Locmem backend failing for the "fail" recipient."""
+
+    def send_messages(self, messages: Any) -> int:
+        if any("fail" in message.to for message in messages):
+            raise ConnectionError("Connection lost")
+        return super().send_messages(messages)
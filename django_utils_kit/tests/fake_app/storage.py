@@ -1,3 +1,4 @@
+from datetime import datetime, timezone
 from io import BytesIO
 
 from django.core.files.storage import Storage
@@ -5,8 +6,17 @@ from django.core.files.storage import Storage
 
 class MockStorage(Storage):
     def open(self, path: str, mode: str = "rb") -> BytesIO:
-        content = f"Example file content {path}"
-        return BytesIO(content.encode())
+        return BytesIO(self._get_content(path))
 
     def exists(self, name: str) -> bool:
         return True
+
+    def size(self, name: str) -> int:
+        return len(self._get_content(name))
+
+    def get_modified_time(self, name: str) -> datetime:
+        return datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    @staticmethod
+    def _get_content(path: str) -> bytes:
+        return f"Example file content {path}".encode()
@@ -1,4 +1,4 @@
-from django.http import HttpResponse, StreamingHttpResponse
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
 from django.views import View
 from rest_framework.permissions import AllowAny
 from rest_framework.request import Request
@@ -25,17 +25,28 @@ class FailedPreconditionExampleView(APIView):
 
 
 class DownloadFileView(View):
-    def get(self, request: Request) -> StreamingHttpResponse:
-        return download_file("path/to/file.txt", MockStorage())
+    def get(self, request: HttpRequest) -> HttpResponse | StreamingHttpResponse:
+        return download_file("path/to/file.txt", MockStorage(), request)
 
 
 class DownloadZipFileView(View):
-    def get(self, request: Request) -> HttpResponse:
+    def get(self, request: Request) -> HttpResponse | StreamingHttpResponse:
         return download_files_as_zip(
             ["path/to/file1.txt", "path/to/file2.txt"], "output.zip", MockStorage()
         )
 
 
+class DownloadZipFileStreamView(View):
+    def get(self, request: Request) -> HttpResponse | StreamingHttpResponse:
+        return download_files_as_zip(
+            ["path/to/file1.txt", "path/to/file2.txt"],
+            "output.zip",
+            MockStorage(),
+            stream=True,
+            chunk_size=8,
+        )
+
+
 class BlockAllViewSet(GenericViewSet):
     permission_classes = [BlockAll]
 
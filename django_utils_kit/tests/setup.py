@@ -21,6 +21,8 @@ settings.configure(
         "django.contrib.sessions",
         "django.contrib.contenttypes",
         "rest_framework",
+        "django_utils_kit",
+        "django_utils_kit.outbox",
         "django_utils_kit.tests.fake_app.apps.FakeAppConfig",
     ],
     # Database
@@ -60,6 +62,7 @@ settings.configure(
 # Routes
 # --------------------------------------------------
 from django_utils_kit.tests.fake_app import views  # noqa
+from django_utils_kit.views import ThumbnailView
 
 urlpatterns = [
     path(
@@ -74,6 +77,12 @@ urlpatterns = [
     ),
     path("download-file/", views.DownloadFileView.as_view(), name="download-file"),
     path("download-zip/", views.DownloadZipFileView.as_view(), name="download-file"),
+    path(
+        "download-zip-stream/",
+        views.DownloadZipFileStreamView.as_view(),
+        name="download-zip-stream",
+    ),
+    path("thumbnails/<str:token>/", ThumbnailView.as_view(), name="thumbnail"),
     path(
         "block-all/", views.BlockAllViewSet.as_view({"get": "list"}), name="block-all"
     ),
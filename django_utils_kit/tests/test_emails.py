@@ -1,7 +1,36 @@
+import asyncio
+from concurrent.futures import Future
+from importlib.util import find_spec
+import socket
+from threading import Event
+from typing import Any
+from unittest import skipIf, skipUnless
+from unittest.mock import patch
+
+from django.apps import apps
 from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail.backends.locmem import EmailBackend
+from django.template import loader
+from django.test import override_settings
+from django.utils.module_loading import autodiscover_modules
 
-from django_utils_kit.emails import Email
+from django_utils_kit.emails import (
+    EMAIL_QUEUE_DROP,
+    Email,
+    EmailBatchResult,
+    EmailQueueFullError,
+    EmailWorkerPool,
+    SMTPAsyncEmailBackend,
+    SyncAsyncEmailBackend,
+    get_async_connection,
+    prewarm_email_templates,
+)
 from django_utils_kit.test_utils import ImprovedTestCase
+from django_utils_kit.tests.fake_app.emails import (
+    MEMORY_ASYNC_BACKEND,
+    MemoryAsyncEmailBackend,
+)
 
 
 class EmailTestCase(ImprovedTestCase):
@@ -42,7 +71,7 @@ class EmailTestCase(ImprovedTestCase):
         self.assertIn("The name is John Doe", mail.outbox[0].body)
 
     def test_send_async(self) -> None:
-        thread = self.email.send_async(
+        future = self.email.send_async(
             {},
             to=["to"],
             cc=["cc"],
@@ -50,11 +79,252 @@ class EmailTestCase(ImprovedTestCase):
             from_email="custom@localhost.com",
             subject="Custom subject",
         )
-        self.assertEqual(len(mail.outbox), 0)
-        thread.join()
+        self.assertIsInstance(future, Future)
+        future.result()
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(mail.outbox[0].to, ["to"])
         self.assertEqual(mail.outbox[0].cc, ["cc"])
         self.assertEqual(mail.outbox[0].bcc, ["bcc"])
         self.assertEqual(mail.outbox[0].from_email, "custom@localhost.com")
         self.assertEqual(mail.outbox[0].subject, "Custom subject")
+
+    def test_send_many(self) -> None:
+        connection = CountingEmailBackend()
+        items = [({"name": f"User {i}"}, [f"user{i}@localhost.com"]) for i in range(5)]
+        items.insert(2, ({}, []))
+        result = self.email.send_many(items, connection=connection, reconnect_every=2)
+        self.assertIsInstance(result, EmailBatchResult)
+        self.assertEqual(result.sent, 5)
+        self.assertEqual(result.failures, [])
+        self.assertGreater(result.throughput, 0)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn("The name is User 4", mail.outbox[4].body)
+        self.assertEmailWasSent("Test subject", to=["user4@localhost.com"])
+        # 1 initial connection + 2 reconnections
+        self.assertEqual(connection.opened, 3)
+        self.assertEqual(connection.closed, 3)
+
+    def test_send_many_failures(self) -> None:
+        connection = CountingEmailBackend()
+        items = [({}, ["first"]), ({}, ["fail"]), ({}, ["last"])]
+        result = self.email.send_many(
+            items, connection=connection, reconnect_every=None
+        )
+        self.assertEqual(result.sent, 2)
+        self.assertEqual(len(result.failures), 1)
+        self.assertEqual(result.failures[0].index, 1)
+        self.assertEqual(result.failures[0].to, ["fail"])
+        self.assertIsInstance(result.failures[0].error, ConnectionError)
+        self.assertEqual([email.to for email in mail.outbox], [["first"], ["last"]])
+        # Reconnected after the failure
+        self.assertEqual(connection.opened, 2)
+
+
+class EmailTemplateTestCase(ImprovedTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.mocker = patch(
+            "django_utils_kit.emails.loader.get_template", wraps=loader.get_template
+        )
+        self.get_template_mock = self.mocker.start()
+
+    def tearDown(self) -> None:
+        self.mocker.stop()
+
+    def test_template_cached(self) -> None:
+        email = Email("Test subject", "email.html")
+        email.send({"name": "John"}, to=["to"])
+        email.send({"name": "Jane"}, to=["to"])
+        self.assertEqual(self.get_template_mock.call_count, 1)
+        self.assertIn("The name is Jane", mail.outbox[1].body)
+
+    def test_autoreload(self) -> None:
+        email = Email("Test subject", "email.html", autoreload=True)
+        email.get_template()
+        email.get_template()
+        self.assertEqual(self.get_template_mock.call_count, 1)
+        with override_settings(DEBUG=True):
+            email.get_template()
+            email.get_template()
+        self.assertEqual(self.get_template_mock.call_count, 3)
+
+    def test_prewarm_email_templates(self) -> None:
+        email = Email("Test subject", "email.html")
+        count = prewarm_email_templates()
+        self.assertGreaterEqual(count, 1)
+        self.assertIsNotNone(email._template)
+        email.send({}, to=["to"])
+        self.assertLessEqual(self.get_template_mock.call_count, count)
+
+    @override_settings(EMAIL_PREWARM_TEMPLATES=True)
+    def test_prewarm_on_ready(self) -> None:
+        email = Email("Test subject", "email.html")
+        with patch(
+            "django_utils_kit.apps.autodiscover_modules", wraps=autodiscover_modules
+        ) as autodiscover_mock:
+            apps.get_app_config("django_utils_kit").ready()
+        autodiscover_mock.assert_called_once_with("emails")
+        self.assertIsNotNone(email._template)
+
+
+class AsyncEmailTestCase(ImprovedTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.email = Email("Test subject", "email.html")
+        MemoryAsyncEmailBackend.reset()
+
+    async def test_asend(self) -> None:
+        await self.email.asend({"name": "John Doe"}, to=["to"], bcc=["bcc"])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("The name is John Doe", mail.outbox[0].body)
+        self.assertEmailWasSent("Test subject", to=["to"], bcc=["bcc"])
+        # No recipients
+        await self.email.asend({})
+        self.assertEqual(len(mail.outbox), 1)
+
+    async def test_asend_with_connection(self) -> None:
+        async with get_async_connection(MEMORY_ASYNC_BACKEND) as connection:
+            await self.email.asend({}, to=["user0"], connection=connection)
+            await self.email.asend({}, to=["user1"], connection=connection)
+            # Left open for the next emails
+            self.assertEqual(MemoryAsyncEmailBackend.closes, 0)
+        self.assertEqual(MemoryAsyncEmailBackend.connections, 1)
+        self.assertEqual(MemoryAsyncEmailBackend.closes, 1)
+        self.assertEqual(len(MemoryAsyncEmailBackend.messages), 2)
+
+    async def test_asend_many(self) -> None:
+        items = [({}, [f"user{i}"]) for i in range(6)] + [({}, ["fail"]), ({}, [])]
+        result = await self.email.asend_many(
+            items, concurrency=3, backend=MEMORY_ASYNC_BACKEND
+        )
+        self.assertEqual(result.sent, 6)
+        self.assertEqual([(f.index, f.to) for f in result.failures], [(6, ["fail"])])
+        self.assertEqual(len(MemoryAsyncEmailBackend.messages), 6)
+        self.assertEqual(MemoryAsyncEmailBackend.max_in_flight, 3)
+        self.assertEqual(MemoryAsyncEmailBackend.connections, 3)
+
+    async def test_asend_many_reconnect(self) -> None:
+        items = [({}, ["user0"]), ({}, ["fail"]), ({}, ["user1"]), ({}, ["user2"])]
+        result = await self.email.asend_many(
+            items, concurrency=1, backend=MEMORY_ASYNC_BACKEND
+        )
+        self.assertEqual(result.sent, 3)
+        # Reopened once, after the failure
+        self.assertEqual(MemoryAsyncEmailBackend.connections, 2)
+
+    async def test_asend_many_connection_error(self) -> None:
+        MemoryAsyncEmailBackend.open_error = ConnectionError("Refused")
+        result = await self.email.asend_many(
+            [({}, ["to"]), ({}, ["to"])], backend=MEMORY_ASYNC_BACKEND
+        )
+        self.assertEqual(result.sent, 0)
+        self.assertEqual(len(result.failures), 2)
+        self.assertIs(result.failures[0].error, MemoryAsyncEmailBackend.open_error)
+
+    def test_get_async_connection(self) -> None:
+        self.assertIsInstance(get_async_connection(), SyncAsyncEmailBackend)
+        connection = get_async_connection(MEMORY_ASYNC_BACKEND)
+        self.assertIsInstance(connection, MemoryAsyncEmailBackend)
+        with override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend"
+        ):
+            self.assertIsInstance(get_async_connection(), SMTPAsyncEmailBackend)
+
+    @skipIf(find_spec("aiosmtplib") is not None, "aiosmtplib is installed")
+    async def test_smtp_without_aiosmtplib(self) -> None:
+        with self.assertRaises(ImproperlyConfigured):
+            await SMTPAsyncEmailBackend().open()
+
+    @skipUnless(
+        find_spec("aiosmtplib") and find_spec("aiosmtpd"),
+        "aiosmtplib and aiosmtpd are required",
+    )
+    def test_smtp(self) -> None:
+        from aiosmtpd.controller import Controller
+
+        class Handler:
+            def __init__(self) -> None:
+                self.envelopes: list[Any] = []
+
+            async def handle_DATA(
+                self, server: Any, session: Any, envelope: Any
+            ) -> str:
+                self.envelopes.append(envelope)
+                return "250 OK"
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        handler = Handler()
+        controller = Controller(handler, hostname="127.0.0.1", port=port)
+        controller.start()
+        try:
+            connection = SMTPAsyncEmailBackend(host="127.0.0.1", port=port)
+            asyncio.run(
+                self.email.asend({}, to=["to@localhost.com"], connection=connection)
+            )
+        finally:
+            controller.stop()
+        self.assertEqual(len(handler.envelopes), 1)
+        self.assertEqual(handler.envelopes[0].rcpt_tos, ["to@localhost.com"])
+        self.assertEqual(handler.envelopes[0].mail_from, "test@localhost.com")
+
+
+class CountingEmailBackend(EmailBackend):
+    """Counts the connections, and fails for the "fail" recipient."""
+
+    opened = 0
+    closed = 0
+
+    def open(self) -> bool:
+        self.opened += 1
+        return True
+
+    def close(self) -> None:
+        self.closed += 1
+
+    def send_messages(self, messages: Any) -> int:
+        if any("fail" in message.to for message in messages):
+            raise ConnectionError("Connection lost")
+        return super().send_messages(messages)
+
+
+class EmailWorkerPoolTestCase(ImprovedTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.release = Event()
+
+    def tearDown(self) -> None:
+        self.release.set()
+
+    def test_block_policy(self) -> None:
+        pool = EmailWorkerPool(max_workers=1, max_queue_size=1, timeout=0.01)
+        futures = [pool.submit(self.release.wait) for _ in range(2)]
+        with self.assertRaises(EmailQueueFullError):
+            pool.submit(self.release.wait)
+        self.release.set()
+        self.assertTrue(all(future.result() for future in futures))
+        # Slots are released once done
+        pool.timeout = None
+        self.assertTrue(pool.submit(self.release.wait).result())
+        pool.shutdown()
+
+    def test_drop_policy(self) -> None:
+        pool = EmailWorkerPool(max_workers=1, max_queue_size=0, policy=EMAIL_QUEUE_DROP)
+        pool.submit(self.release.wait)
+        future = pool.submit(self.release.wait)
+        self.assertIsInstance(future.exception(), EmailQueueFullError)
+        self.release.set()
+        pool.shutdown()
+
+    def test_shutdown_drains_queue(self) -> None:
+        pool = EmailWorkerPool(max_workers=1)
+        email = Email("Test subject", "email.html")
+        for i in range(5):
+            pool.submit(email.send, {}, to=[f"to{i}"])
+        pool.shutdown()
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_invalid_policy(self) -> None:
+        with self.assertRaises(ValueError):
+            EmailWorkerPool(policy="unknown")
@@ -1,11 +1,534 @@
-from django_utils_kit.test_utils import APITestCase
+from collections.abc import Iterator
+import hashlib
+from io import BytesIO
+import json
+import os
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+from time import sleep
+from typing import Any
+from unittest.mock import patch
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse
+from django.test import override_settings
+
+from django_utils_kit.files import (
+    ZIP_AUTO,
+    ZIP_NAMES_PATH,
+    adownload_file,
+    adownload_files_as_zip,
+    download_file,
+    download_files_as_zip,
+    download_finished,
+    zip_entry_written,
+)
+from django_utils_kit.test_utils import APITestCase, ImprovedTestCase
+from django_utils_kit.tests.fake_app.storage import MockStorage
 
 
 class FilesTestCase(APITestCase):
     def test_download_file(self) -> None:
         response = self.api_client.get("/download-file/")
         self.assertDownloadFile(response, "file.txt")
+        self.assertEqual(response["Content-Length"], "37")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["ETag"], '"65920080-25"')
+        self.assertEqual(response["Last-Modified"], "Mon, 01 Jan 2024 00:00:00 GMT")
+        self.assertEqual(response.getvalue(), b"Example file content path/to/file.txt")
+
+    def test_download_file_chunks(self) -> None:
+        storage = MockStorage()
+        # Consumed response
+        file = BytesIO(b"0123456789")
+        with patch.object(storage, "open", return_value=file):
+            response = download_file("path/to/file.txt", storage, chunk_size=4)
+        chunks = list(response.streaming_content)
+        self.assertListEqual(chunks, [b"0123", b"4567", b"89"])
+        self.assertTrue(file.closed)
+        # Closed before being consumed
+        file = BytesIO(b"0123456789")
+        with patch.object(storage, "open", return_value=file):
+            response = download_file("path/to/file.txt", storage, chunk_size=4)
+        response.close()
+        self.assertTrue(file.closed)
+
+    def test_download_file_not_modified(self) -> None:
+        response = self.api_client.get(
+            "/download-file/", headers={"If-None-Match": '"65920080-25"'}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], '"65920080-25"')
+        response = self.api_client.get(
+            "/download-file/",
+            headers={"If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"},
+        )
+        self.assertEqual(response.status_code, 304)
+        response = self.api_client.get(
+            "/download-file/", headers={"If-None-Match": '"other"'}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_download_file_single_range(self) -> None:
+        response = self.api_client.get(
+            "/download-file/", headers={"Range": "bytes=8-11"}
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 8-11/37")
+        self.assertEqual(response["Content-Length"], "4")
+        self.assertEqual(response.getvalue(), b"file")
+        # Suffix range
+        response = self.api_client.get("/download-file/", headers={"Range": "bytes=-3"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 34-36/37")
+        self.assertEqual(response.getvalue(), b"txt")
+
+    def test_download_file_multiple_ranges(self) -> None:
+        response = self.api_client.get(
+            "/download-file/", headers={"Range": "bytes=0-6, 29-"}
+        )
+        self.assertEqual(response.status_code, 206)
+        content_type, boundary = response["Content-Type"].split("; boundary=")
+        self.assertEqual(content_type, "multipart/byteranges")
+        content = response.getvalue()
+        self.assertEqual(int(response["Content-Length"]), len(content))
+        self.assertEqual(
+            content,
+            (
+                f"--{boundary}\r\nContent-Type: text/plain\r\n"
+                "Content-Range: bytes 0-6/37\r\n\r\nExample\r\n"
+                f"--{boundary}\r\nContent-Type: text/plain\r\n"
+                "Content-Range: bytes 29-36/37\r\n\r\nfile.txt\r\n"
+                f"--{boundary}--\r\n"
+            ).encode(),
+        )
+
+    def test_download_file_invalid_ranges(self) -> None:
+        # Unsatisfiable
+        response = self.api_client.get(
+            "/download-file/", headers={"Range": "bytes=50-"}
+        )
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */37")
+        # Malformed
+        response = self.api_client.get(
+            "/download-file/", headers={"Range": "bytes=5-2"}
+        )
+        self.assertEqual(response.status_code, 200)
+        # Outdated If-Range
+        response = self.api_client.get(
+            "/download-file/", headers={"Range": "bytes=0-6", "If-Range": '"other"'}
+        )
+        self.assertEqual(response.status_code, 200)
 
     def test_download_files_as_zip(self) -> None:
         response = self.api_client.get("/download-zip/")
         self.assertDownloadZipFile(response, "output.zip", ["file1.txt", "file2.txt"])
+        # Seekable output: sizes in the local headers, no data descriptor or zip64
+        with ZipFile(BytesIO(response.content)) as zf:
+            for info in zf.infolist():
+                self.assertEqual(info.flag_bits & 0x8, 0)
+                self.assertEqual(info.extra, b"")
+
+    def test_download_files_as_zip_stream(self) -> None:
+        response = self.api_client.get("/download-zip-stream/")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 2)
+        with ZipFile(BytesIO(b"".join(chunks))) as zf:
+            self.assertListEqual(zf.namelist(), ["file1.txt", "file2.txt"])
+            self.assertEqual(
+                zf.read("file1.txt"), b"Example file content path/to/file1.txt"
+            )
+            self.assertIsNone(zf.testzip())
+
+    def test_download_files_as_zip_prefetch(self) -> None:
+        paths = [f"path/to/file{i}.txt" for i in range(10)]
+        for stream in [False, True]:
+            # Small max bytes to read the files partly in the workers, partly when zipped
+            response = download_files_as_zip(
+                paths,
+                "output.zip",
+                MockStorage(),
+                stream=stream,
+                chunk_size=8,
+                prefetch=3,
+                prefetch_max_bytes=40,
+            )
+            with ZipFile(BytesIO(response.getvalue())) as zf:
+                self.assertListEqual(zf.namelist(), [f"file{i}.txt" for i in range(10)])
+                for i, path in enumerate(paths):
+                    self.assertEqual(
+                        zf.read(f"file{i}.txt"), f"Example file content {path}".encode()
+                    )
+
+    def test_download_files_as_zip_compression(self) -> None:
+        paths = ["path/to/file.txt", "path/to/image.PNG"]
+        for stream in [False, True]:
+            response = download_files_as_zip(
+                paths, "output.zip", MockStorage(), stream=stream, compression=ZIP_AUTO
+            )
+            with ZipFile(BytesIO(response.getvalue())) as zf:
+                self.assertEqual(zf.getinfo("file.txt").compress_type, ZIP_DEFLATED)
+                self.assertEqual(zf.getinfo("image.PNG").compress_type, ZIP_STORED)
+                self.assertEqual(
+                    zf.read("file.txt"), b"Example file content path/to/file.txt"
+                )
+            # Settings
+            with override_settings(ZIP_COMPRESSION=ZIP_DEFLATED, ZIP_COMPRESSLEVEL=9):
+                response = download_files_as_zip(
+                    paths, "output.zip", MockStorage(), stream=stream
+                )
+            with ZipFile(BytesIO(response.getvalue())) as zf:
+                for info in zf.infolist():
+                    self.assertEqual(info.compress_type, ZIP_DEFLATED)
+                self.assertIsNone(zf.testzip())
+
+    def test_download_files_as_zip_names(self) -> None:
+        paths = ["a/file.txt", "b/file.txt", "c/file.txt", "MANIFEST.json"]
+        cases = [
+            ({}, ["file.txt", "file (1).txt", "file (2).txt", "MANIFEST.json"]),
+            (ZIP_NAMES_PATH, paths),
+            (
+                {"a/file.txt": "first.txt", "b/file.txt": "first.txt"},
+                ["first.txt", "first (1).txt", "file.txt", "MANIFEST.json"],
+            ),
+        ]
+        for names, expected_names in cases:
+            response = download_files_as_zip(
+                paths, "output.zip", MockStorage(), names=names
+            )
+            with ZipFile(BytesIO(response.getvalue())) as zf:
+                self.assertListEqual(zf.namelist(), expected_names)
+
+    def test_download_files_as_zip_manifest(self) -> None:
+        paths = ["a/file.txt", "b/file.txt", "MANIFEST.json"]
+        response = download_files_as_zip(
+            paths, "output.zip", MockStorage(), stream=True, manifest=True
+        )
+        with ZipFile(BytesIO(response.getvalue())) as zf:
+            self.assertListEqual(
+                zf.namelist(),
+                ["file.txt", "file (1).txt", "MANIFEST (1).json", "MANIFEST.json"],
+            )
+            manifest = json.loads(zf.read("MANIFEST.json"))
+            for entry, path in zip(manifest["files"], paths):
+                content = zf.read(entry["name"])
+                info = zf.getinfo(entry["name"])
+                self.assertEqual(entry["path"], path)
+                self.assertEqual(entry["size"], len(content))
+                self.assertEqual(entry["crc32"], f"{info.CRC:08x}")
+                self.assertEqual(entry["sha256"], hashlib.sha256(content).hexdigest())
+
+
+class AsyncFilesTestCase(ImprovedTestCase):
+    async def test_adownload_file(self) -> None:
+        storage = MockStorage()
+        sync_response = download_file("path/to/file.txt", storage, chunk_size=4)
+        response = await adownload_file(
+            "path/to/file.txt", storage, chunk_size=4, batch_size=3
+        )
+        self.assertTrue(response.is_async)
+        self.assertDictEqual(dict(response.headers), dict(sync_response.headers))
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 10)
+        self.assertEqual(b"".join(chunks), b"Example file content path/to/file.txt")
+
+    async def test_adownload_file_not_modified(self) -> None:
+        request = self.build_fake_request()
+        request.META["HTTP_IF_NONE_MATCH"] = '"65920080-25"'
+        response = await adownload_file("path/to/file.txt", MockStorage(), request)  # ty: ignore
+        self.assertEqual(response.status_code, 304)
+
+    async def test_adownload_files_as_zip(self) -> None:
+        paths = ["path/to/file1.txt", "path/to/file2.txt"]
+        for stream in [False, True]:
+            sync_response = download_files_as_zip(
+                paths, "output.zip", MockStorage(), stream=stream
+            )
+            response = await adownload_files_as_zip(
+                paths, "output.zip", MockStorage(), stream=stream, chunk_size=8
+            )
+            self.assertDictEqual(dict(response.headers), dict(sync_response.headers))
+            if stream:
+                self.assertTrue(response.is_async)
+                content = b"".join(
+                    [chunk async for chunk in response.streaming_content]
+                )
+            else:
+                content = response.content
+            with ZipFile(BytesIO(content)) as zf:
+                self.assertListEqual(zf.namelist(), ["file1.txt", "file2.txt"])
+
+
+class ZipCacheTestCase(ImprovedTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = TemporaryDirectory()
+        self.cache_storage = FileSystemStorage(location=self.directory.name)
+        self.storage = MockStorage()
+        self.paths = ["path/to/file1.txt", "path/to/file2.txt"]
+        cache.clear()
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_cached_zip(self) -> None:
+        with patch.object(self.storage, "open", wraps=self.storage.open) as mock:
+            for paths in [self.paths, self.paths]:
+                response = download_files_as_zip(
+                    paths, "output.zip", self.storage, cache_storage=self.cache_storage
+                )
+                expected_files = ["file1.txt", "file2.txt"]
+                self.assertDownloadZipFile(response, "output.zip", expected_files)  # ty: ignore
+                self.assertEqual(response["Content-Type"], "application/zip")
+                response.close()
+            # Built only once
+            self.assertEqual(mock.call_count, 2)
+        names = self.cache_storage.listdir("zip_cache")[1]
+        self.assertEqual(len(names), 1)
+        # Built in a seekable file, without data descriptors
+        with (
+            self.cache_storage.open(f"zip_cache/{names[0]}") as file,
+            ZipFile(file) as zf,
+        ):
+            self.assertEqual(zf.infolist()[0].flag_bits & 0x8, 0)
+
+    def test_cached_zip_order(self) -> None:
+        # Same basename: the suffix depends on the order of the paths
+        same_names = ["a/file.txt", "b/file.txt"]
+        for paths in [same_names, same_names[::-1]]:
+            response = download_files_as_zip(
+                paths, "output.zip", self.storage, cache_storage=self.cache_storage
+            )
+            with ZipFile(BytesIO(response.getvalue())) as zip_file:
+                self.assertListEqual(zip_file.namelist(), ["file.txt", "file (1).txt"])
+                content = zip_file.read("file.txt")
+            self.assertEqual(content, f"Example file content {paths[0]}".encode())
+            response.close()
+        # Not served from the cache of the other order
+        self.assertEqual(len(self.cache_storage.listdir("zip_cache")[1]), 2)
+
+    def test_cached_zip_concurrency(self) -> None:
+        with patch.object(self.storage, "open", wraps=self.storage.open) as mock:
+            threads = [
+                Thread(
+                    target=download_files_as_zip,
+                    args=(self.paths, "output.zip", self.storage),
+                    kwargs={"cache_storage": self.cache_storage},
+                )
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(mock.call_count, 2)
+
+    def test_cached_zip_while_saving(self) -> None:
+        saving, resume = Event(), Event()
+        save = self.cache_storage._save
+
+        def slow_save(name: str, content: File) -> str:
+            # The file is created before its content is written
+            chunks = content.chunks
+
+            def slow_chunks(chunk_size: int | None = None) -> Iterator[bytes]:
+                saving.set()
+                resume.wait(5)
+                yield from chunks(chunk_size)
+
+            content.chunks = slow_chunks  # ty: ignore
+            return save(name, content)
+
+        contents: list[bytes] = []
+
+        def download() -> None:
+            response = download_files_as_zip(
+                self.paths, "output.zip", self.storage, cache_storage=self.cache_storage
+            )
+            contents.append(b"".join(response))
+            response.close()
+
+        with patch.object(self.cache_storage, "_save", slow_save):
+            threads = [Thread(target=download), Thread(target=download)]
+            threads[0].start()
+            saving.wait(5)
+            threads[1].start()
+            sleep(0.1)
+            resume.set()
+            for thread in threads:
+                thread.join()
+        for content in contents:
+            with ZipFile(BytesIO(content)) as zip_file:
+                self.assertListEqual(zip_file.namelist(), ["file1.txt", "file2.txt"])
+
+    def test_cached_zip_eviction(self) -> None:
+        def download(paths: list[str]) -> set[str]:
+            download_files_as_zip(
+                paths,
+                "output.zip",
+                self.storage,
+                cache_storage=self.cache_storage,
+                cache_max_size=500,
+            ).close()
+            return set(self.cache_storage.listdir("zip_cache")[1])
+
+        first = download(self.paths)
+        second = download(self.paths[:1]) - first
+        # Used again, so the second one is the least recently used
+        download(self.paths)
+        names = download(self.paths[1:])
+        self.assertEqual(len(names), 2)
+        self.assertTrue(first <= names)
+        self.assertFalse(second & names)
+        sizes = [self.cache_storage.size(f"zip_cache/{name}") for name in names]
+        self.assertLessEqual(sum(sizes), 500)
+
+    def test_cached_zip_without_metadata(self) -> None:
+        with patch.object(self.storage, "size", side_effect=NotImplementedError):
+            response = download_files_as_zip(
+                self.paths, "output.zip", self.storage, cache_storage=self.cache_storage
+            )
+        self.assertDownloadZipFile(response, "output.zip", ["file1.txt", "file2.txt"])  # ty: ignore
+        # Changes could not be detected
+        self.assertFalse(self.cache_storage.exists("zip_cache"))
+
+
+class DownloadSignalsTestCase(ImprovedTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.events: list[dict[str, Any]] = []
+        download_finished.connect(self.receiver)
+        zip_entry_written.connect(self.receiver)
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        download_finished.disconnect(self.receiver)
+        zip_entry_written.disconnect(self.receiver)
+
+    def receiver(self, **kwargs: Any) -> None:
+        self.events.append(kwargs)
+
+    def test_download_finished(self) -> None:
+        response = download_file("path/to/file.txt", MockStorage(), chunk_size=8)
+        self.assertEqual(len(response.getvalue()), 37)
+        self.assertListEqual(self.events, [])
+        response.close()
+        self.assertEqual(len(self.events), 1)
+        event = self.events[0]
+        self.assertIs(event["sender"], download_file)
+        self.assertEqual(event["filename"], "file.txt")
+        self.assertEqual(event["status_code"], 200)
+        self.assertEqual(event["bytes_sent"], 37)
+        self.assertFalse(event["aborted"])
+        self.assertLessEqual(event["time_to_first_byte"], event["duration"])
+
+    def test_download_finished_aborted(self) -> None:
+        response = download_file("path/to/file.txt", MockStorage(), chunk_size=8)
+        next(iter(response))
+        response.close()
+        self.assertEqual(self.events[0]["bytes_sent"], 8)
+        self.assertTrue(self.events[0]["aborted"])
+        # Not streamed
+        request = self.build_fake_request()
+        request.META["HTTP_IF_NONE_MATCH"] = '"65920080-25"'
+        download_file("path/to/file.txt", MockStorage(), request)  # ty: ignore
+        self.assertEqual(self.events[1]["status_code"], 304)
+        self.assertEqual(self.events[1]["bytes_sent"], 0)
+
+    def test_zip_entry_written(self) -> None:
+        paths = ["path/to/file1.txt", "path/to/file2.txt"]
+        response = download_files_as_zip(paths, "output.zip", MockStorage())
+        self.assertListEqual(
+            [event.get("name", event.get("filename")) for event in self.events],
+            ["file1.txt", "file2.txt", "output.zip"],
+        )
+        for event in self.events[:2]:
+            self.assertIs(event["sender"], download_files_as_zip)
+            self.assertEqual(event["size"], 38)
+            self.assertGreaterEqual(event["read_time"], 0)
+            self.assertGreaterEqual(event["write_time"], 0)
+        self.assertEqual(self.events[2]["bytes_sent"], len(response.content))
+
+    def test_receivers_with_sender(self) -> None:
+        download_finished.disconnect(self.receiver)
+        zip_entry_written.disconnect(self.receiver)
+        download_finished.connect(self.receiver, sender=download_file)
+        zip_entry_written.connect(self.receiver, sender=download_files_as_zip)
+        try:
+            download_file("path/to/file.txt", MockStorage()).close()
+            paths = ["path/to/file1.txt", "path/to/file2.txt"]
+            download_files_as_zip(paths, "output.zip", MockStorage())
+        finally:
+            download_finished.disconnect(self.receiver, sender=download_file)
+            zip_entry_written.disconnect(self.receiver, sender=download_files_as_zip)
+        self.assertListEqual(
+            [event.get("name", event.get("filename")) for event in self.events],
+            ["file.txt", "file1.txt", "file2.txt"],
+        )
+
+
+class DownloadFileOffloadTestCase(ImprovedTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = TemporaryDirectory()
+        self.storage = FileSystemStorage(location=self.directory.name)
+        self.storage.save("folder/my file.txt", ContentFile(b"Local file content"))
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_file_response(self) -> None:
+        response = download_file("folder/my file.txt", self.storage, offload=True)
+        self.assertIsInstance(response, FileResponse)
+        self.assertDownloadFile(response, "my file.txt")  # ty: ignore
+        self.assertEqual(response["Content-Length"], "18")
+        self.assertEqual(response.getvalue(), b"Local file content")
+        response.close()
+        # Range requests are not handled by FileResponse
+        request = self.build_fake_request()
+        request.META["HTTP_RANGE"] = "bytes=0-4"
+        response = download_file("folder/my file.txt", self.storage, request, True)  # ty: ignore
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.getvalue(), b"Local")
+
+    @override_settings(DOWNLOAD_OFFLOAD_HEADER="X-Sendfile")
+    def test_header_with_path(self) -> None:
+        response = download_file("folder/my file.txt", self.storage, offload=True)
+        self.assertDownloadFile(response, "my file.txt")  # ty: ignore
+        self.assertEqual(
+            response["X-Sendfile"],
+            os.path.join(os.path.realpath(self.directory.name), "folder/my file.txt"),
+        )
+        self.assertEqual(response["Content-Type"], "text/plain")
+        self.assertEqual(response.content, b"")
+
+    def test_header_with_locations(self) -> None:
+        locations = {
+            "/elsewhere/": "/other/",
+            os.path.realpath(self.directory.name): "/protected/",
+        }
+        with override_settings(
+            DOWNLOAD_OFFLOAD_HEADER="X-Accel-Redirect",
+            DOWNLOAD_OFFLOAD_LOCATIONS=locations,
+        ):
+            response = download_file("folder/my file.txt", self.storage, offload=True)
+            self.assertEqual(
+                response["X-Accel-Redirect"], "/protected/folder/my%20file.txt"
+            )
+        # Outside of the locations
+        with override_settings(
+            DOWNLOAD_OFFLOAD_HEADER="X-Accel-Redirect",
+            DOWNLOAD_OFFLOAD_LOCATIONS={"/elsewhere/": "/other/"},
+        ):
+            response = download_file("folder/my file.txt", self.storage, offload=True)
+            self.assertNotIn("X-Accel-Redirect", response)
+            self.assertIsInstance(response, FileResponse)
+            response.close()
@@ -1,16 +1,45 @@
+import base64
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
 import os
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
 
-from PIL import Image
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.test import override_settings
+from PIL import Image, ImageSequence
 
 from django_utils_kit.images import (
+    DEFAULT_REDUCING_GAP,
+    IMAGE_BUDGET_DRAFT,
+    ImageBatchResult,
+    ImageTooLargeError,
+    Rendition,
+    _draft_image,
     downsize_and_save_image_from_path,
+    downsize_and_save_image_from_storage,
+    downsize_and_save_images,
+    downsize_frames,
     downsize_image,
+    encode_image,
+    generate_renditions,
+    get_image_format,
+    get_image_mime_type,
+    get_rendition_name,
     image_to_base64,
+    image_to_base64_from_storage,
+    is_format_supported,
+    open_image,
 )
 from django_utils_kit.test_utils import ImprovedTestCase
+from django_utils_kit.tests.fake_app.models import ImprovedUser
 from django_utils_kit.tests.fixtures import FIXTURES_DIR, GITHUB_LOGO_PATH
 
 IMAGE_COPY_PATH = os.path.join(FIXTURES_DIR, "github-logo-copy.png")
+JPEG_PATH = os.path.join(FIXTURES_DIR, "large.jpg")
+GIF_PATH = os.path.join(FIXTURES_DIR, "animated.gif")
 
 
 class ImagesTestCase(ImprovedTestCase):
@@ -18,11 +47,23 @@ class ImagesTestCase(ImprovedTestCase):
         super().setUp()
         img = Image.open(GITHUB_LOGO_PATH)
         img.save(IMAGE_COPY_PATH)
+        Image.new("RGB", (2000, 1000), "red").save(JPEG_PATH)
+        frames = [
+            Image.new("RGB", (400, 200), color) for color in ["red", "blue", "green"]
+        ]
+        frames[0].save(
+            GIF_PATH,
+            save_all=True,
+            append_images=frames[1:],
+            duration=[100, 200, 300],
+            loop=0,
+        )
 
     def tearDown(self) -> None:
         super().tearDown()
-        if os.path.exists(IMAGE_COPY_PATH):
-            os.remove(IMAGE_COPY_PATH)
+        for path in [IMAGE_COPY_PATH, JPEG_PATH, GIF_PATH]:
+            if os.path.exists(path):
+                os.remove(path)
 
     def test_downsize_and_save_image_from_path(self) -> None:
         # Original image
@@ -56,6 +97,235 @@ class ImagesTestCase(ImprovedTestCase):
         self.assertEqual(resized_image.height, 100)
         self.assertEqual(resized_image.width, 100)
 
+    def test_downsize_image_draft(self) -> None:
+        # The given image is not drafted, so it can be downsized to several sizes
+        image = Image.open(JPEG_PATH)
+        resized, resized_image = downsize_image(image, 100)
+        self.assertTrue(resized)
+        self.assertEqual(image.size, (2000, 1000))
+        self.assertEqual(resized_image.size, (100, 50))
+        resized, resized_image = downsize_image(image, 1000)
+        self.assertTrue(resized)
+        self.assertEqual(resized_image.size, (1000, 500))
+        # Images owned by the helpers are decoded at a reduced scale,
+        # still twice as large as the output
+        image = Image.open(JPEG_PATH)
+        _draft_image(image, 100, DEFAULT_REDUCING_GAP)
+        self.assertEqual(image.size, (250, 125))
+        value = image_to_base64(JPEG_PATH, 100)
+        with Image.open(BytesIO(base64.b64decode(value))) as image:
+            self.assertEqual(image.size, (100, 50))
+        # Fully decoded
+        image = Image.open(JPEG_PATH)
+        resized, resized_image = downsize_image(
+            image, 100, resample=Image.Resampling.LANCZOS, reducing_gap=None
+        )
+        self.assertTrue(resized)
+        self.assertEqual(image.size, (2000, 1000))
+        self.assertEqual(resized_image.size, (100, 50))
+
+    def test_downsize_and_save_image_from_path_options(self) -> None:
+        downsize_and_save_image_from_path(
+            JPEG_PATH, 100, 100, resample=Image.Resampling.NEAREST, reducing_gap=None
+        )
+        with Image.open(JPEG_PATH) as image:
+            self.assertEqual(image.size, (100, 50))
+
+    def test_downsize_and_save_images(self) -> None:
+        paths = [IMAGE_COPY_PATH, JPEG_PATH, "missing.png"]
+        results = list(downsize_and_save_images(paths, 600, 600, max_workers=2))
+        results_per_path = {result.path: result for result in results}
+        self.assertEqual(len(results), 3)
+        self.assertEqual(
+            results_per_path[IMAGE_COPY_PATH],
+            ImageBatchResult(IMAGE_COPY_PATH, False, None),
+        )
+        self.assertEqual(
+            results_per_path[JPEG_PATH], ImageBatchResult(JPEG_PATH, True, None)
+        )
+        missing_result = results_per_path["missing.png"]
+        self.assertFalse(missing_result.resized)
+        self.assertIn("FileNotFoundError", missing_result.error or "")
+        with Image.open(JPEG_PATH) as image:
+            self.assertEqual(image.size, (600, 300))
+
+    def test_downsize_and_save_images_with_storage(self) -> None:
+        with TemporaryDirectory() as directory, ThreadPoolExecutor(2) as executor:
+            storage = FileSystemStorage(location=directory)
+            Image.open(JPEG_PATH).save(storage.path("large.jpg"))
+            Image.open(GITHUB_LOGO_PATH).save(storage.path("logo.png"))
+            results = downsize_and_save_images(
+                ["large.jpg", "logo.png"], 100, 100, storage=storage, executor=executor
+            )
+            self.assertEqual(
+                sorted(results),
+                [
+                    ImageBatchResult("large.jpg", True, None),
+                    ImageBatchResult("logo.png", True, None),
+                ],
+            )
+            with Image.open(storage.path("large.jpg")) as image:
+                self.assertEqual(image.size, (100, 50))
+            with Image.open(storage.path("logo.png")) as image:
+                self.assertEqual(image.size, (100, 100))
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+    def test_downsize_images_command(self) -> None:
+        stdout, stderr = StringIO(), StringIO()
+        with TemporaryDirectory() as directory:
+            list_path = os.path.join(directory, "paths.txt")
+            with open(list_path, "w") as f:
+                f.write(f"{JPEG_PATH}\n\nmissing.png\n")
+            call_command(
+                "downsize_images",
+                IMAGE_COPY_PATH,
+                from_file=list_path,
+                width=200,
+                height=200,
+                workers=1,
+                progress_every=2,
+                stdout=stdout,
+                stderr=stderr,
+            )
+        output = stdout.getvalue()
+        self.assertIn("Processed 2 images", output)
+        self.assertIn("Processed 3 images (2 resized, 1 errors)", output)
+        self.assertIn("missing.png: FileNotFoundError", stderr.getvalue())
+
+    def test_downsize_and_save_image_from_storage(self) -> None:
+        with TemporaryDirectory() as directory:
+            storage = FileSystemStorage(location=directory)
+            Image.open(JPEG_PATH).save(storage.path("large.jpg"))
+            # Already small enough
+            with patch.object(storage, "save", wraps=storage.save) as save_mock:
+                resized = downsize_and_save_image_from_storage(
+                    "large.jpg", 2000, 2000, storage
+                )
+                self.assertFalse(resized)
+                save_mock.assert_not_called()
+            # Resized
+            resized = downsize_and_save_image_from_storage(
+                "large.jpg", 100, 100, storage
+            )
+            self.assertTrue(resized)
+            self.assertEqual(os.listdir(directory), ["large.jpg"])
+            with Image.open(storage.path("large.jpg")) as image:
+                self.assertEqual(image.size, (100, 50))
+                self.assertEqual(image.format, "JPEG")
+            # Failed upload: the original is restored
+            save = storage._save
+            failures = [OSError("Upload failed")]
+
+            def failing_save(name: str, content: File) -> str:
+                if failures:
+                    raise failures.pop()
+                return save(name, content)
+
+            with (
+                patch.object(storage, "_save", failing_save),
+                self.assertRaises(OSError),
+            ):
+                downsize_and_save_image_from_storage("large.jpg", 50, 50, storage)
+            self.assertEqual(os.listdir(directory), ["large.jpg"])
+            with Image.open(storage.path("large.jpg")) as image:
+                self.assertEqual(image.size, (100, 50))
+        # Storage is required
+        with self.assertRaises(ValueError):
+            downsize_and_save_image_from_storage("large.jpg", 100, 100)
+
+    def test_downsize_and_save_image_to_overwriting_storage(self) -> None:
+        with TemporaryDirectory() as directory:
+            storage = FileSystemStorage(location=directory, allow_overwrite=True)
+            Image.open(JPEG_PATH).save(storage.path("large.jpg"))
+            with patch.object(storage, "_save", wraps=storage._save) as save_mock:
+                self.assertTrue(
+                    downsize_and_save_image_from_storage("large.jpg", 100, 100, storage)
+                )
+            # Uploaded once, in place
+            save_mock.assert_called_once()
+            self.assertEqual(os.listdir(directory), ["large.jpg"])
+
+    def test_storage_file_without_readinto(self) -> None:
+        class ReadOnlyFile:
+            """Remote file object without `readinto`."""
+
+            def __init__(self, path: str) -> None:
+                with open(path, "rb") as f:
+                    self._content = BytesIO(f.read())
+                self.read = self._content.read
+                self.seek = self._content.seek
+                self.tell = self._content.tell
+                self.close = self._content.close
+
+        storage = FileSystemStorage(location=FIXTURES_DIR)
+        with patch.object(
+            storage, "open", lambda name, mode: File(ReadOnlyFile(storage.path(name)))
+        ):
+            self.assertEqual(
+                image_to_base64_from_storage("large.jpg", 100, storage),
+                image_to_base64(JPEG_PATH, 100),
+            )
+
+    def test_storage_helpers_with_field_file(self) -> None:
+        user = ImprovedUser(first_name="John", last_name="Doe")
+        user.avatar.save(
+            "logo.png", self.uploaded_file_from_path(GITHUB_LOGO_PATH), save=False
+        )
+        try:
+            self.assertEqual(
+                image_to_base64_from_storage(user.avatar, 100),  # ty: ignore
+                image_to_base64(GITHUB_LOGO_PATH, 100),
+            )
+            resized = downsize_and_save_image_from_storage(user.avatar, 100, 100)  # ty: ignore
+            self.assertTrue(resized)
+            self.assertEqual(
+                image_to_base64_from_storage(user.avatar),  # ty: ignore
+                image_to_base64(GITHUB_LOGO_PATH, 100),
+            )
+        finally:
+            user.avatar.delete(save=False)
+
+    def test_generate_renditions(self) -> None:
+        sizes = {"thumb": 50, "full": 1000, "card": 400}
+        with TemporaryDirectory() as directory:
+            storage = FileSystemStorage(location=directory)
+            with patch(
+                "django_utils_kit.images.Image.open", wraps=Image.open
+            ) as open_mock:
+                renditions = generate_renditions(
+                    JPEG_PATH, "uploads/large.jpg", sizes, storage
+                )
+                # Run again to replace the existing renditions
+                generate_renditions(JPEG_PATH, "uploads/large.jpg", sizes, storage)
+            self.assertEqual(open_mock.call_count, 2)
+            self.assertEqual(list(renditions), ["full", "card", "thumb"])
+            self.assertEqual(
+                renditions["full"],
+                Rendition("full", "uploads/large_full.jpg", 1000, 500),
+            )
+            self.assertEqual(
+                renditions["card"],
+                Rendition("card", "uploads/large_card.jpg", 400, 200),
+            )
+            self.assertEqual(
+                renditions["thumb"],
+                Rendition("thumb", "uploads/large_thumb.jpg", 50, 25),
+            )
+            self.assertEqual(len(os.listdir(os.path.join(directory, "uploads"))), 3)
+            for rendition in renditions.values():
+                with Image.open(storage.path(rendition.name)) as image:
+                    self.assertEqual(image.size, (rendition.width, rendition.height))
+                    self.assertEqual(image.format, "JPEG")
+
+    def test_get_rendition_name(self) -> None:
+        self.assertEqual(
+            get_rendition_name("avatars/john.png", "thumb"), "avatars/john_thumb.png"
+        )
+        self.assertEqual(
+            get_rendition_name("avatars/john.png", "thumb", "thumbs"),
+            "thumbs/john_thumb.png",
+        )
+
     def test_image_to_base64(self) -> None:
         result = image_to_base64(IMAGE_COPY_PATH)
         self.assertIs(type(result), bytes)
@@ -69,3 +339,172 @@ class ImagesTestCase(ImprovedTestCase):
         self.assertIs(type(original_value), bytes)
         self.assertIs(type(unchanged_value), bytes)
         self.assertIs(type(changed_value), bytes)
+
+    def test_image_to_base64_with_format(self) -> None:
+        png_value = image_to_base64(IMAGE_COPY_PATH, 100)
+        webp_value = image_to_base64(IMAGE_COPY_PATH, 100, format="webp", quality=50)
+        self.assertLess(len(webp_value), len(png_value))
+        with Image.open(BytesIO(base64.b64decode(webp_value))) as image:
+            self.assertEqual(image.format, "WEBP")
+            self.assertEqual(image.size, (100, 100))
+        with self.assertRaises(ValueError):
+            image_to_base64(IMAGE_COPY_PATH, format="unknown")
+
+    def test_image_to_base64_with_quality(self) -> None:
+        high_value = image_to_base64(JPEG_PATH, 500, quality=95)
+        low_value = image_to_base64(JPEG_PATH, 500, quality=10, optimize=True)
+        self.assertLess(len(low_value), len(high_value))
+
+    def test_encode_image(self) -> None:
+        image = Image.new("RGBA", (10, 10))
+        image.info["comment"] = b"Secret"
+        # Converted to RGB for JPEG
+        buffered = BytesIO()
+        encode_image(image, buffered, "JPEG", progressive=True)
+        with Image.open(buffered) as encoded_image:
+            self.assertEqual(encoded_image.mode, "RGB")
+            self.assertEqual(encoded_image.info["comment"], b"Secret")
+        # Without metadata
+        buffered = BytesIO()
+        encode_image(image, buffered, "JPEG", strip_metadata=True)
+        with Image.open(buffered) as encoded_image:
+            self.assertNotIn("comment", encoded_image.info)
+        self.assertEqual(image.info["comment"], b"Secret")
+
+    def test_formats(self) -> None:
+        self.assertEqual(get_image_format("jpg"), "JPEG")
+        self.assertEqual(get_image_format("WebP"), "WEBP")
+        self.assertTrue(is_format_supported("webp"))
+        self.assertFalse(is_format_supported("unknown"))
+        self.assertEqual(get_image_mime_type("WEBP"), "image/webp")
+        self.assertIsNone(get_image_mime_type("unknown"))
+
+    def test_image_to_base64_passthrough(self) -> None:
+        with open(IMAGE_COPY_PATH, "rb") as f:
+            expected = base64.b64encode(f.read())
+        with patch("django_utils_kit.images.encode_image") as encode_mock:
+            # From path
+            self.assertEqual(image_to_base64(IMAGE_COPY_PATH), expected)
+            self.assertEqual(image_to_base64(IMAGE_COPY_PATH, 600), expected)
+            # From path, memory-mapped
+            with patch("django_utils_kit.images.BASE64_MMAP_MIN_SIZE", 1):
+                self.assertEqual(image_to_base64(IMAGE_COPY_PATH), expected)
+            # From file object, with chunks that are not a multiple of 3
+            with (
+                open(IMAGE_COPY_PATH, "rb") as f,
+                patch("django_utils_kit.images.BASE64_CHUNK_SIZE", 1000),
+            ):
+                self.assertEqual(image_to_base64(f), expected)
+            encode_mock.assert_not_called()
+        # Re-encoded when options are provided
+        self.assertNotEqual(image_to_base64(IMAGE_COPY_PATH, optimize=True), expected)
+
+    def test_downsize_frames(self) -> None:
+        with Image.open(GIF_PATH) as image:
+            frames = list(downsize_frames(image, 100, 100))
+        self.assertEqual([frame.size for frame in frames], [(100, 50)] * 3)
+        self.assertEqual([frame.info["duration"] for frame in frames], [100, 200, 300])
+        # Budgets
+        with Image.open(GIF_PATH) as image:
+            with self.assertRaises(ImageTooLargeError):
+                downsize_frames(image, 100, 100, max_frames=2)
+            with self.assertRaises(ImageTooLargeError):
+                downsize_frames(image, 100, 100, max_pixels=400 * 200 * 2)
+        # Budgets from settings, used by every helper
+        with override_settings(IMAGE_MAX_FRAMES=2):
+            with self.assertRaises(ImageTooLargeError):
+                image_to_base64(GIF_PATH, 100)
+            with self.assertRaises(ImageTooLargeError):
+                downsize_and_save_image_from_path(GIF_PATH, 100, 100)
+        with (
+            override_settings(IMAGE_MAX_FRAMES_PIXELS=400 * 200 * 2),
+            self.assertRaises(ImageTooLargeError),
+        ):
+            image_to_base64(GIF_PATH, 100)
+
+    def test_animated_image_to_base64(self) -> None:
+        value = image_to_base64(GIF_PATH, 100)
+        with Image.open(BytesIO(base64.b64decode(value))) as image:
+            self._assert_animation(image, (100, 50))
+        # Not supported by the output format
+        value = image_to_base64(GIF_PATH, 100, format="JPEG")
+        with Image.open(BytesIO(base64.b64decode(value))) as image:
+            self.assertFalse(getattr(image, "is_animated", False))
+            self.assertEqual(image.size, (100, 50))
+
+    def test_animated_downsize_and_save(self) -> None:
+        self.assertTrue(downsize_and_save_image_from_path(GIF_PATH, 200, 200))
+        with Image.open(GIF_PATH) as image:
+            self._assert_animation(image, (200, 100))
+        with TemporaryDirectory() as directory:
+            storage = FileSystemStorage(location=directory)
+            with open(GIF_PATH, "rb") as f, storage.open("animated.gif", "wb") as g:
+                g.write(f.read())
+            downsize_and_save_image_from_storage("animated.gif", 50, 50, storage)
+            with Image.open(storage.path("animated.gif")) as image:
+                self._assert_animation(image, (50, 25))
+
+    def _assert_animation(self, image: Image.Image, size: tuple[int, int]) -> None:
+        self.assertEqual(image.format, "GIF")
+        self.assertEqual(getattr(image, "n_frames", 1), 3)
+        self.assertEqual(image.info["loop"], 0)
+        durations = []
+        for frame in ImageSequence.Iterator(image):
+            self.assertEqual(frame.size, size)
+            durations.append(frame.info["duration"])
+        self.assertEqual(durations, [100, 200, 300])
+
+    def test_open_image_max_bytes(self) -> None:
+        size = os.path.getsize(IMAGE_COPY_PATH)
+        open_image(IMAGE_COPY_PATH, max_bytes=size).close()
+        with self.assertRaises(ImageTooLargeError):
+            open_image(IMAGE_COPY_PATH, max_bytes=size - 1)
+        with open(IMAGE_COPY_PATH, "rb") as f, self.assertRaises(ImageTooLargeError):
+            open_image(f, max_bytes=size - 1)
+
+    def test_open_image_max_pixels(self) -> None:
+        open_image(IMAGE_COPY_PATH, max_pixels=512 * 512).close()
+        with self.assertRaises(ImageTooLargeError):
+            open_image(IMAGE_COPY_PATH, max_pixels=512 * 512 - 1)
+        # Draft mode is only available for JPEG files
+        with self.assertRaises(ImageTooLargeError):
+            open_image(IMAGE_COPY_PATH, max_pixels=100, policy=IMAGE_BUDGET_DRAFT)
+        with open_image(
+            JPEG_PATH, max_pixels=600 * 300, policy=IMAGE_BUDGET_DRAFT
+        ) as image:
+            self.assertEqual(image.size, (500, 250))
+        # Beyond the max draft scale
+        with self.assertRaises(ImageTooLargeError):
+            open_image(JPEG_PATH, max_pixels=100, policy=IMAGE_BUDGET_DRAFT)
+
+    @override_settings(
+        IMAGE_MAX_PIXELS=250 * 125, IMAGE_BUDGET_POLICY=IMAGE_BUDGET_DRAFT
+    )
+    def test_image_budget_from_settings(self) -> None:
+        with self.assertRaises(ImageTooLargeError):
+            image_to_base64(IMAGE_COPY_PATH, 100)
+        with self.assertRaises(ImageTooLargeError):
+            downsize_image(Image.open(IMAGE_COPY_PATH), 100)
+        # Images given to `downsize_image` are rejected instead of drafted
+        with Image.open(JPEG_PATH) as image, self.assertRaises(ImageTooLargeError):
+            downsize_image(image, 100)
+        self.assertEqual(image.size, (2000, 1000))
+        # Drafted within the budget, then saved
+        storage = FileSystemStorage(location=FIXTURES_DIR)
+        self.assertTrue(
+            downsize_and_save_image_from_storage("large.jpg", 500, 500, storage)
+        )
+        with Image.open(JPEG_PATH) as image:
+            self.assertEqual(image.size, (250, 125))
+        Image.new("RGB", (2000, 1000), "red").save(JPEG_PATH)
+        self.assertTrue(downsize_and_save_image_from_path(JPEG_PATH, 500, 500))
+        with Image.open(JPEG_PATH) as image:
+            self.assertEqual(image.size, (250, 125))
+        Image.new("RGB", (2000, 1000), "red").save(JPEG_PATH)
+        value = image_to_base64(JPEG_PATH, 100)
+        with Image.open(BytesIO(base64.b64decode(value))) as image:
+            self.assertEqual(image.size, (100, 50))
+        # Drafted below the target, but the original is larger
+        value = image_to_base64(JPEG_PATH, 500)
+        with Image.open(BytesIO(base64.b64decode(value))) as image:
+            self.assertEqual(image.size, (250, 125))
@@ -1,6 +1,10 @@
 from django.test import RequestFactory, override_settings
 
-from django_utils_kit.network import get_client_ip, get_server_domain
+from django_utils_kit.network import (
+    get_accepted_media_types,
+    get_client_ip,
+    get_server_domain,
+)
 from django_utils_kit.test_utils import ImprovedTestCase
 
 
@@ -21,6 +25,18 @@ class NetworkTestCase(ImprovedTestCase):
         request.META["HTTP_X_FORWARDED_FOR"] = "127.0.0.3"
         self.assertEqual(get_client_ip(request), "127.0.0.3")
 
+    def test_get_accepted_media_types(self) -> None:
+        request = self.factory.get("/my-url/")
+        self.assertEqual(get_accepted_media_types(request), [])
+        request = self.factory.get(
+            "/my-url/",
+            HTTP_ACCEPT="application/json, image/webp;q=0.8, image/AVIF;q=0.9, image/png;q=0, */*;q=bad",
+        )
+        self.assertEqual(
+            get_accepted_media_types(request),
+            ["application/json", "image/avif", "image/webp"],
+        )
+
     @override_settings(ALLOWED_HOSTS=["expected.com", "ignored.com"])
     def test_get_server_domain_with_hosts(self) -> None:
         self.assertEqual(get_server_domain(), "expected.com")
@@ -0,0 +1,154 @@
+from datetime import timedelta
+from io import StringIO
+from itertools import count
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import override_settings
+from django.utils import timezone
+
+from django_utils_kit.emails import Email
+from django_utils_kit.outbox.emails import (
+    OUTBOX_BACKOFF_BASE,
+    OUTBOX_LEASE,
+    _renew_lease,
+    get_retry_delay,
+    send_outbox_emails,
+)
+from django_utils_kit.outbox.models import OutboxEmail
+from django_utils_kit.test_utils import ImprovedTestCase
+from django_utils_kit.tests.fake_app.emails import FAILING_BACKEND
+
+LOCMEM_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+
+
+class OutboxTestCase(ImprovedTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.email = Email("Test subject", "email.html")
+
+    def test_enqueue(self) -> None:
+        outbox_email = self.email.enqueue(
+            {"name": "John Doe"}, to=["to"], bcc=["bcc"], idempotency_key="welcome:1"
+        )
+        self.assertIsNotNone(outbox_email)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(outbox_email.status, OutboxEmail.Status.PENDING)
+        self.assertEqual(outbox_email.to, ["to"])
+        self.assertEqual(outbox_email.content_subtype, "html")
+        self.assertIn("The name is John Doe", outbox_email.body)  # ty: ignore
+        # Same key, same email
+        duplicate = self.email.enqueue({}, to=["to"], idempotency_key="welcome:1")
+        self.assertEqual(duplicate, outbox_email)
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+        # No recipients
+        self.assertIsNone(self.email.enqueue({}))
+
+    @override_settings(EMAIL_OUTBOX=True)
+    def test_send_async_outbox_mode(self) -> None:
+        future = self.email.send_async({}, to=["to"])
+        self.assertTrue(future.done())
+        self.assertIsInstance(future.result(), OutboxEmail)
+        self.assertEqual(len(mail.outbox), 0)
+        send_outbox_emails()
+        self.assertEmailWasSent("Test subject", to=["to"])
+
+    def test_send_outbox_emails(self) -> None:
+        for i in range(3):
+            self.email.enqueue({}, to=[f"to{i}"], idempotency_key=f"key{i}")
+        later = self.email.enqueue({}, to=["later"])
+        OutboxEmail.objects.filter(pk=later.pk).update(
+            next_attempt_at=timezone.now() + timedelta(hours=1)
+        )
+        result = send_outbox_emails(batch_size=2)
+        self.assertEqual((result.sent, result.retried, result.failed), (2, 0, 0))
+        result = send_outbox_emails(batch_size=2)
+        self.assertEqual(result.processed, 1)
+        self.assertEqual(send_outbox_emails().processed, 0)
+        self.assertEqual(
+            [email.to for email in mail.outbox], [["to0"], ["to1"], ["to2"]]
+        )
+        self.assertEqual(
+            OutboxEmail.objects.filter(status=OutboxEmail.Status.SENT).count(), 3
+        )
+        # Message-ID derived from the idempotency key
+        message_id = mail.outbox[0].extra_headers["Message-ID"]
+        self.assertEqual(
+            OutboxEmail.objects.get(idempotency_key="key0")
+            .to_message()
+            .extra_headers["Message-ID"],
+            message_id,
+        )
+
+    def test_retry_with_backoff(self) -> None:
+        failing = self.email.enqueue({}, to=["fail"], backend=FAILING_BACKEND)
+        self.email.enqueue({}, to=["to"], backend=FAILING_BACKEND)
+        result = send_outbox_emails(max_attempts=2)
+        self.assertEqual((result.sent, result.retried, result.failed), (1, 1, 0))
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, OutboxEmail.Status.PENDING)
+        self.assertEqual(failing.attempts, 1)
+        self.assertEqual(failing.last_error, "ConnectionError: Connection lost")
+        delay = (failing.next_attempt_at - timezone.now()).total_seconds()
+        self.assertAlmostEqual(delay, OUTBOX_BACKOFF_BASE, delta=5)
+        # Not due yet
+        self.assertEqual(send_outbox_emails(max_attempts=2).processed, 0)
+        # Last attempt
+        OutboxEmail.objects.filter(pk=failing.pk).update(next_attempt_at=timezone.now())
+        result = send_outbox_emails(max_attempts=2)
+        self.assertEqual(result.failed, 1)
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, OutboxEmail.Status.FAILED)
+
+    def test_get_retry_delay(self) -> None:
+        self.assertEqual(get_retry_delay(1, 10, 100), 10)
+        self.assertEqual(get_retry_delay(3, 10, 100), 40)
+        self.assertEqual(get_retry_delay(5, 10, 100), 100)
+
+    def test_rate_limits(self) -> None:
+        for i in range(3):
+            self.email.enqueue({}, to=[f"to{i}"])
+        with patch("django_utils_kit.outbox.emails.sleep") as sleep_mock:
+            send_outbox_emails(rate_limits={LOCMEM_BACKEND: 10})
+        self.assertEqual(sleep_mock.call_count, 2)
+        self.assertLessEqual(sleep_mock.call_args[0][0], 0.1)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_renew_lease(self) -> None:
+        for i in range(3):
+            self.email.enqueue({}, to=[f"to{i}"])
+        leases: list[int] = []
+
+        def renew_lease(pks: set[int]) -> None:
+            leases.append(len(pks))
+            _renew_lease(pks)
+
+        # Each email takes a whole lease
+        clock = count(step=OUTBOX_LEASE)
+        with (
+            patch("django_utils_kit.outbox.emails.monotonic", lambda: next(clock)),
+            patch("django_utils_kit.outbox.emails._renew_lease", renew_lease),
+        ):
+            self.assertEqual(send_outbox_emails().sent, 3)
+        self.assertListEqual(leases, [3, 2, 1])
+
+    def test_connection_closed_on_error(self) -> None:
+        self.email.enqueue({}, to=["to"])
+        with (
+            patch.object(OutboxEmail, "save", side_effect=DatabaseError),
+            patch.object(EmailBackend, "close") as close_mock,
+            self.assertRaises(DatabaseError),
+        ):
+            send_outbox_emails()
+        # Before connecting, and once done
+        self.assertEqual(close_mock.call_count, 2)
+
+    def test_send_outbox_emails_command(self) -> None:
+        self.email.enqueue({}, to=["to"])
+        stdout = StringIO()
+        call_command("send_outbox_emails", once=True, stdout=stdout)
+        self.assertIn("Sent 1 emails (0 retried, 0 failed)", stdout.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
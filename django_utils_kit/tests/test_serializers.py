@@ -1,9 +1,23 @@
-from django.test import override_settings
+import base64
+from io import BytesIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.test import RequestFactory, override_settings
+from PIL import Image
+from rest_framework import serializers
 
 from django_utils_kit.images import image_to_base64
-from django_utils_kit.serializers import ReadOnlyModelSerializer, ThumbnailField
+from django_utils_kit.serializers import (
+    ReadOnlyModelSerializer,
+    ThumbnailField,
+    _make_thumbnail,
+    invalidate_thumbnail,
+)
 from django_utils_kit.test_utils import ImprovedTestCase
 from django_utils_kit.tests.fixtures import GITHUB_LOGO_PATH
+from django_utils_kit.tests.utils import AvatarTestCase
 
 
 class ReadOnlyModelSerializerTestCase(ImprovedTestCase):
@@ -29,9 +43,144 @@ class ThumbnailFieldTestCase(ImprovedTestCase):
         repr = self.field.to_representation(image)
         self.assertNotEqual(base64, repr)
 
+    def test_to_internal_value(self) -> None:
+        image = self.uploaded_file_from_path(GITHUB_LOGO_PATH)
+        self.assertEqual(self.field.to_internal_value(image), image)
+        with (
+            override_settings(IMAGE_MAX_PIXELS=1000),
+            self.assertRaises(serializers.ValidationError) as context,
+        ):
+            self.field.to_internal_value(image)
+        self.assertEqual(context.exception.detail[0].code, "image_too_large")
+
     @override_settings(MAX_THUMBNAIL_SIZE=1000)
     def test_to_representation_max_size(self) -> None:
         image = self.uploaded_file_from_path(GITHUB_LOGO_PATH)
         base64 = image_to_base64(image)
         repr = self.field.to_representation(image)
         self.assertEqual(base64, repr)
+
+
+class ThumbnailFieldFormatTestCase(AvatarTestCase):
+    class Serializer(serializers.Serializer):
+        avatar = ThumbnailField(formats=["AVIF", "webp"], quality=50)
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.factory = RequestFactory()
+
+    def test_accepted_format(self) -> None:
+        request = self.factory.get("/", HTTP_ACCEPT="application/json, image/webp")
+        self.assertEqual(self._get_thumbnail_format(request), "WEBP")
+        request = self.factory.get("/", HTTP_ACCEPT="image/webp, image/avif")
+        self.assertEqual(self._get_thumbnail_format(request), "AVIF")
+
+    def test_no_accepted_format(self) -> None:
+        request = self.factory.get("/", HTTP_ACCEPT="application/json, */*")
+        self.assertEqual(self._get_thumbnail_format(request), "PNG")
+        self.assertEqual(self._get_thumbnail_format(None), "PNG")
+
+    @override_settings(THUMBNAIL_FORMATS=["WEBP"])
+    def test_formats_from_settings(self) -> None:
+        class Serializer(serializers.Serializer):
+            avatar = ThumbnailField()
+
+        request = self.factory.get("/", HTTP_ACCEPT="image/webp")
+        serializer = Serializer(self.user, context={"request": request})
+        data = base64.b64decode(serializer.data["avatar"])
+        with Image.open(BytesIO(data)) as image:
+            self.assertEqual(image.format, "WEBP")
+
+    def _get_thumbnail_format(self, request: object) -> str | None:
+        serializer = self.Serializer(self.user, context={"request": request})
+        data = base64.b64decode(serializer.data["avatar"])
+        with Image.open(BytesIO(data)) as image:
+            return image.format
+
+
+@override_settings(THUMBNAIL_CACHE_ALIAS="default")
+class ThumbnailFieldCacheTestCase(AvatarTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.field = ThumbnailField()
+        self.mocker = patch(
+            "django_utils_kit.serializers._make_thumbnail", wraps=_make_thumbnail
+        )
+        self.make_thumbnail_mock = self.mocker.start()
+
+    def tearDown(self) -> None:
+        self.mocker.stop()
+        cache.clear()
+        super().tearDown()
+
+    def test_cache(self) -> None:
+        first = self.field.to_representation(self.avatar)
+        second = self.field.to_representation(self.avatar)
+        self.assertEqual(first, second)
+        self.assertEqual(self.make_thumbnail_mock.call_count, 1)
+        # Different size
+        with override_settings(MAX_THUMBNAIL_SIZE=50):
+            self.field.to_representation(self.avatar)
+        self.assertEqual(self.make_thumbnail_mock.call_count, 2)
+
+    def test_cache_outdated(self) -> None:
+        self.field.to_representation(self.avatar)
+        with patch.object(self.avatar.storage, "size", return_value=1):
+            self.field.to_representation(self.avatar)
+        self.assertEqual(self.make_thumbnail_mock.call_count, 2)
+
+    def test_invalidate_thumbnail(self) -> None:
+        self.field.to_representation(self.avatar)
+        invalidate_thumbnail(str(self.avatar))
+        self.field.to_representation(self.avatar)
+        self.assertEqual(self.make_thumbnail_mock.call_count, 2)
+
+    def test_invalidate_thumbnail_formats(self) -> None:
+        field = ThumbnailField(formats=["webp"])
+        request = RequestFactory().get("/", HTTP_ACCEPT="image/webp")
+        field.bind("avatar", serializers.Serializer(context={"request": request}))
+        field.to_representation(self.avatar)
+        # Field-level formats, not in the settings
+        invalidate_thumbnail(str(self.avatar), formats=["webp"])
+        field.to_representation(self.avatar)
+        self.assertEqual(self.make_thumbnail_mock.call_count, 2)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ThumbnailFieldUrlTestCase(AvatarTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.request = RequestFactory().get("/")
+
+    def test_url(self) -> None:
+        field = ThumbnailField(as_url=True)
+        field._context = {"request": self.request}
+        url = field.to_representation(self.avatar)
+        self.assertIsInstance(url, str)
+        self.assertTrue(str(url).startswith("http://testserver/thumbnails/"))
+        # Same file, same URL
+        self.assertEqual(url, field.to_representation(self.avatar))
+        # Updated file, new URL
+        with patch.object(self.avatar.storage, "size", return_value=1):
+            new_url = field.to_representation(self.avatar)
+        self.assertNotEqual(url, new_url)
+
+    @override_settings(THUMBNAIL_AS_URL=True)
+    def test_inline_max_bytes(self) -> None:
+        size = self.avatar.size
+        field = ThumbnailField(inline_max_bytes=size)
+        self.assertIsInstance(field.to_representation(self.avatar), bytes)
+        field = ThumbnailField(inline_max_bytes=size - 1)
+        self.assertIsInstance(field.to_representation(self.avatar), str)
+
+    def test_unconfigured_storage(self) -> None:
+        # Not in settings.STORAGES, so the view could not find the file
+        field = ThumbnailField(as_url=True)
+        location = self.avatar.storage.location
+        self.avatar.storage = FileSystemStorage(location=location)
+        self.assertIsInstance(field.to_representation(self.avatar), bytes)
+
+    def test_uploaded_file(self) -> None:
+        field = ThumbnailField(as_url=True)
+        image = self.uploaded_file_from_path(GITHUB_LOGO_PATH)
+        self.assertIsInstance(field.to_representation(image), bytes)
@@ -0,0 +1,63 @@
+from io import BytesIO
+from unittest.mock import patch
+
+from django.core import signing
+from django.test import RequestFactory, override_settings
+from PIL import Image
+
+from django_utils_kit.serializers import THUMBNAIL_SIGNING_SALT, ThumbnailField
+from django_utils_kit.tests.utils import AvatarTestCase
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ThumbnailViewTestCase(AvatarTestCase):
+    def test_thumbnail(self) -> None:
+        url = self._get_url(ThumbnailField(as_url=True))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("max-age=31536000", response["Cache-Control"])
+        with Image.open(BytesIO(response.content)) as image:
+            self.assertEqual(image.size, (100, 100))
+
+    @override_settings(THUMBNAIL_CACHE_ALIAS="default")
+    def test_thumbnail_with_format(self) -> None:
+        field = ThumbnailField(as_url=True, formats=["WEBP"])
+        url = self._get_url(field, HTTP_ACCEPT="image/webp")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+
+    def test_invalid_token(self) -> None:
+        url = self._get_url(ThumbnailField(as_url=True))
+        response = self.client.get(url[:-2] + "xx/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_replaced_file(self) -> None:
+        url = self._get_url(ThumbnailField(as_url=True))
+        with patch.object(self.avatar.storage, "size", return_value=1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_file(self) -> None:
+        token = signing.dumps(
+            ["default", "missing.png", 100, None, None, ""],
+            salt=THUMBNAIL_SIGNING_SALT,
+        )
+        response = self.client.get(f"/thumbnails/{token}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_storage(self) -> None:
+        token = signing.dumps(
+            ["unknown", self.avatar.name, 100, None, None, ""],
+            salt=THUMBNAIL_SIGNING_SALT,
+        )
+        response = self.client.get(f"/thumbnails/{token}/")
+        self.assertEqual(response.status_code, 404)
+
+    def _get_url(self, field: ThumbnailField, **headers: str) -> str:
+        field._context = {"request": RequestFactory().get("/", **headers)}
+        url = field.to_representation(self.avatar)
+        self.assertIsInstance(url, str)
+        return str(url).replace("http://testserver", "")
@@ -0,0 +1,26 @@
+from typing import cast
+
+from django.db.models.fields.files import FieldFile
+
+from django_utils_kit.test_utils import ImprovedTestCase
+from django_utils_kit.tests.fake_app.models import ImprovedUser
+from django_utils_kit.tests.fixtures import GITHUB_LOGO_PATH
+
+
+class AvatarTestCase(ImprovedTestCase):
+    """Base TestCase for a user with a saved avatar, deleted after each test."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.user = ImprovedUser(first_name="John", last_name="Doe")
+        image = self.uploaded_file_from_path(GITHUB_LOGO_PATH)
+        self.user.avatar.save("logo.png", image, save=False)
+
+    def tearDown(self) -> None:
+        self.user.avatar.delete(save=False)
+        super().tearDown()
+
+    @property
+    def avatar(self) -> FieldFile:
+        # Typed as the model field without a Django type-checker plugin
+        return cast(FieldFile, self.user.avatar)
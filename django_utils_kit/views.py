@@ -0,0 +1,63 @@
+"""Additional views for Django."""
+
+import base64
+import mimetypes
+
+from django.core import signing
+from django.core.files.storage import InvalidStorageError, storages
+from django.http import Http404, HttpRequest, HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views import View
+
+from django_utils_kit.images import get_image_mime_type
+from django_utils_kit.serializers import (
+    THUMBNAIL_SIGNING_SALT,
+    _get_file_version,
+    _hash_version,
+    get_thumbnail,
+)
+
+THUMBNAIL_MAX_AGE = 365 * 24 * 60 * 60  # 1 year
+
+
+class ThumbnailView(View):
+    """
+    Serves the thumbnails of the signed URLs generated by `ThumbnailField` in URL mode.
+    URLs change with the files, so responses can be cached for a long time by clients and CDNs.
+    Files are read from the storage of `settings.STORAGES` recorded in the URL,
+    and URLs of files that changed since are not found.
+
+    Usage:
+        >>> path(
+        ...     "thumbnails/<str:token>/",
+        ...     ThumbnailView.as_view(),
+        ...     name="thumbnail",
+        ... )
+    """
+
+    max_age: int = THUMBNAIL_MAX_AGE
+
+    def get(self, request: HttpRequest, token: str) -> HttpResponse:
+        try:
+            alias, name, max_size, format, quality, version = signing.loads(
+                token, salt=THUMBNAIL_SIGNING_SALT
+            )
+            storage = storages[alias]
+        except (signing.BadSignature, ValueError, InvalidStorageError):
+            raise Http404
+        if not storage.exists(name):
+            raise Http404
+        # The file was replaced since the URL was generated
+        if version != _hash_version(_get_file_version(name, storage)):
+            raise Http404
+        thumbnail = get_thumbnail(name, storage, max_size, format, quality)
+        if format is not None:
+            content_type = get_image_mime_type(format)
+        else:
+            content_type, _ = mimetypes.guess_type(name)
+        response = HttpResponse(
+            base64.b64decode(thumbnail),
+            content_type=content_type or "application/octet-stream",
+        )
+        patch_cache_control(response, public=True, max_age=self.max_age, immutable=True)
+        return response